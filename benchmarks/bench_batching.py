@@ -0,0 +1,64 @@
+"""
+Latency/throughput of adapter micro-batching against a backend that serves
+only a few requests at a time (SLOTS), as a hosted model endpoint would.
+
+    python -m benchmarks.bench_batching
+"""
+import asyncio
+import time
+
+from src.adapters.mock_flashcard import MockFlashcard
+from src.tool_cache import ToolResponseCache
+from src.tool_orchestrator import ToolOrchestrator
+
+SLOTS = 4
+BURST = 256
+CONFIGS = [(1, 0), (8, 2), (32, 5), (64, 10)]
+
+
+class SlottedFlashcard(MockFlashcard):
+    """MockFlashcard behind a server that runs at most SLOTS requests at once."""
+
+    def __init__(self):
+        self.slots = asyncio.Semaphore(SLOTS)
+
+    async def call(self, payload):
+        async with self.slots:
+            return await super().call(payload)
+
+    async def call_batch(self, payloads):
+        async with self.slots:
+            return await super().call_batch(payloads)
+
+
+async def timed_call(orch, payload):
+    start = time.perf_counter()
+    await orch.call_tool("flashcard_generator", payload)
+    return time.perf_counter() - start
+
+
+async def run(batch_size, wait_ms):
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0), batch_size=batch_size, batch_wait_ms=wait_ms)
+    orch.register_adapter("flashcard_generator", SlottedFlashcard())
+
+    # A single request on an idle system pays the batching wait.
+    idle = await timed_call(orch, {"topic": "idle", "count": 3})
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(
+        timed_call(orch, {"topic": f"topic {i}", "count": 3}) for i in range(BURST)
+    )))
+    elapsed = time.perf_counter() - start
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"batch={batch_size:3d} wait={wait_ms:4.1f}ms | idle {idle * 1e3:6.1f}ms | "
+          f"burst {BURST / elapsed:7.0f} calls/s  p50 {p50 * 1e3:7.1f}ms  p99 {p99 * 1e3:7.1f}ms")
+
+
+def main():
+    for batch_size, wait_ms in CONFIGS:
+        asyncio.run(run(batch_size, wait_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Tail latency of MockFlashcard with an occasional slow response, with and
+without hedged requests.
+
+    python -m benchmarks.bench_hedging
+"""
+import asyncio
+import time
+
+from src.adapters.latency import lognormal, with_tail
+from src.adapters.mock_flashcard import MockFlashcard
+from src.hedging import HedgePolicy
+from src.tool_cache import ToolResponseCache
+from src.tool_orchestrator import ToolOrchestrator
+
+CALLS = 400
+CONCURRENCY = 16
+
+
+async def run(label, hedge):
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0))
+    latency = with_tail(lognormal(0.02, 0.2, seed=1), slow=0.3, probability=0.03, seed=2)
+    orch.register_adapter("flashcard_generator", MockFlashcard(latency=latency), hedge=hedge)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await orch.call_tool("flashcard_generator", {"topic": f"topic {i}", "count": 3})
+            return time.perf_counter() - start
+
+    latencies = sorted(await asyncio.gather(*(one(i) for i in range(CALLS))))
+    state = orch.adapter_states()["flashcard_generator"]
+    pick = lambda p: latencies[int(len(latencies) * p) - 1] * 1e3
+    print(f"{label:12s} p50 {pick(0.5):6.1f}ms  p95 {pick(0.95):6.1f}ms  p99 {pick(0.99):6.1f}ms  "
+          f"hedges fired {state['hedges_fired']:3d} won {state['hedges_won']:3d}  adapter calls {state['calls']}")
+
+
+def main():
+    asyncio.run(run("no hedging", None))
+    asyncio.run(run("hedge @ p95", HedgePolicy(percentile=95, min_samples=20)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Bytes per in-memory user profile: the previous dict/list/datetime layout
+versus the slotted UserProfile records used by StateManager.
+
+    python -m benchmarks.bench_profile_memory
+"""
+import time
+import timeit
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from src.state_manager import StateManager
+
+USERS = 5000
+TOOLS = ["note_maker", "flashcard_generator", "concept_explainer"]
+MESSAGE = "Can you explain photosynthesis again?"
+
+
+def build_dict_profiles():
+    # Layout used before: one dict per user, lists of dicts holding datetimes,
+    # re-sliced on every append.
+    store = {}
+    for i in range(USERS):
+        user = {
+            "user_id": f"user{i}", "name": "Learner", "grade_level": "10",
+            "learning_style": "visual", "emotional_state": "focused", "mastery_level": 3,
+            "teaching_style": "direct", "last_interaction": datetime.utcnow(),
+            "recent_tools": [], "conversation_history": [],
+        }
+        for n in range(15):
+            tools = user["recent_tools"]
+            tools.append({"tool": TOOLS[n % 3], "timestamp": datetime.utcnow()})
+            user["recent_tools"] = tools[-10:]
+        for n in range(30):
+            history = user["conversation_history"]
+            history.append({"role": "user", "content": MESSAGE, "timestamp": datetime.utcnow()})
+            user["conversation_history"] = history[-20:]
+        store[user["user_id"]] = user
+    return store
+
+
+def build_slotted_profiles():
+    state = StateManager(max_users=0, ttl_seconds=0)
+    for i in range(USERS):
+        uid = f"user{i}"
+        state.upsert_user({"user_id": uid, "name": "Learner", "grade_level": "10",
+                           "learning_style": "visual", "emotional_state": "focused", "mastery_level": 3})
+        for n in range(15):
+            state.add_tool_usage(uid, TOOLS[n % 3])
+        for n in range(30):
+            state.add_conversation(uid, "user", MESSAGE)
+    return state
+
+
+def measure(build):
+    tracemalloc.start()
+    kept = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size / USERS
+
+
+def append_cost():
+    user = {"conversation_history": [{"role": "user", "content": MESSAGE, "timestamp": datetime.utcnow()}] * 20}
+    ring = deque([("user", MESSAGE, 0)] * 20, maxlen=20)
+
+    def list_append():
+        history = user["conversation_history"]
+        history.append({"role": "user", "content": MESSAGE, "timestamp": datetime.utcnow()})
+        user["conversation_history"] = history[-20:]
+
+    def ring_append():
+        ring.append(("user", MESSAGE, int(time.time())))
+
+    n = 200000
+    return timeit.timeit(list_append, number=n) / n, timeit.timeit(ring_append, number=n) / n
+
+
+def main():
+    dict_bytes = measure(build_dict_profiles)
+    slot_bytes = measure(build_slotted_profiles)
+    list_cost, ring_cost = append_cost()
+    print(f"dict profiles:    {dict_bytes:8.0f} bytes/profile  history append {list_cost * 1e9:6.0f} ns")
+    print(f"slotted profiles: {slot_bytes:8.0f} bytes/profile  history append {ring_cost * 1e9:6.0f} ns")
+    print(f"memory reduction: {100 * (1 - slot_bytes / dict_bytes):7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
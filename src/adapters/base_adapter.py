@@ -1,11 +1,44 @@
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
 import asyncio
 
 class BaseAdapter:
     """
     Base adapter interface for all tools.
     Subclasses must implement async `call(payload)` method.
+    Set `cacheable = False` on adapters whose output must not be reused
+    for an identical payload (e.g. non-deterministic generators).
+    Responses go to ToolOrchestrator's response cache only for adapters that
+    opt in with `cache_responses = True`. `volatile_fields` lists payload
+    fields the output does not depend on; they are left out of the cache key.
+    Never list fields the adapter reads or echoes (this base class echoes
+    the whole payload, so it declares none).
+    Backends that serve many payloads in one request override `call_batch`
+    and set `supports_batch = True` so ToolOrchestrator can batch calls for them.
+
+    `latency` is the simulated round trip in seconds, or a zero-argument
+    callable drawing one (see src.adapters.latency) passed to the constructor.
     """
+    cacheable = True
+    cache_responses = False
+    volatile_fields: Tuple[str, ...] = ()
+    supports_batch = False
+    latency = 0.05
+
+    def __init__(self, latency: Optional[Union[float, Callable[[], float]]] = None):
+        if latency is not None:
+            self.latency = latency
+
+    def sample_latency(self) -> float:
+        latency = self.latency
+        return latency() if callable(latency) else latency
+
     async def call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        await asyncio.sleep(0.05)
+        await asyncio.sleep(self.sample_latency())
         return {"status": "ok", "echo": payload}
+
+    async def call_batch(self, payloads: List[Dict[str, Any]]) -> List[Union[Dict[str, Any], BaseException]]:
+        """
+        Returns one result per payload, in order. A failed item is returned
+        as its exception instead of failing the whole batch.
+        """
+        return list(await asyncio.gather(*(self.call(p) for p in payloads), return_exceptions=True))
@@ -0,0 +1,30 @@
+"""
+Latency distributions for the mock adapters, e.g.
+MockFlashcard(latency=with_tail(lognormal(0.06, 0.2), slow=0.5, probability=0.02)).
+Each returns a zero-argument callable giving one latency in seconds.
+"""
+import random
+from typing import Callable, Optional, Union
+
+Latency = Union[float, Callable[[], float]]
+
+
+def _sample(latency: Latency) -> float:
+    return latency() if callable(latency) else latency
+
+
+def uniform(low: float, high: float, seed: Optional[int] = None) -> Callable[[], float]:
+    rng = random.Random(seed)
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float, seed: Optional[int] = None) -> Callable[[], float]:
+    """Right-skewed latency around `median`; larger `sigma` means a longer tail."""
+    rng = random.Random(seed)
+    return lambda: median * rng.lognormvariate(0.0, sigma)
+
+
+def with_tail(base: Latency, slow: Latency, probability: float, seed: Optional[int] = None) -> Callable[[], float]:
+    """`base` latency, except that a `probability` fraction of calls take `slow` instead."""
+    rng = random.Random(seed)
+    return lambda: _sample(slow) if rng.random() < probability else _sample(base)
@@ -1,5 +1,5 @@
 from .base_adapter import BaseAdapter
-from typing import Dict, Any
+from typing import Dict, Any, List
 import asyncio
 from src.utils import check_required
 
@@ -9,10 +9,22 @@ class MockConceptExplainer(BaseAdapter):
     Expects payload: {"concept_to_explain"/"topic": str, optional "desired_depth"}
     Returns: explanation, examples, practice questions.
     """
+    supports_batch = True
+    # Responses never depend on the learner or the chat history.
+    cache_responses = True
+    volatile_fields = ("user_info", "chat_history")
+    latency = 0.07
+
     async def call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        await asyncio.sleep(0.07)
+        await asyncio.sleep(self.sample_latency())
+        return self._respond(payload)
+
+    async def call_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One round trip for the whole batch.
+        await asyncio.sleep(self.sample_latency())
+        return [self._respond(p) for p in payloads]
 
-        
+    def _respond(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         ok, missing = check_required({"required": ["concept_to_explain"]}, payload)
         if not ok:
             
@@ -1,5 +1,5 @@
 from .base_adapter import BaseAdapter
-from typing import Dict, Any
+from typing import Dict, Any, List
 import asyncio
 from src.utils import check_required
 
@@ -9,10 +9,22 @@ class MockNoteMaker(BaseAdapter):
     Expects payload: {"topic": str, optional other fields}
     Returns: notes with title, summary, and sections.
     """
+    supports_batch = True
+    # Responses never depend on the learner or the chat history.
+    cache_responses = True
+    volatile_fields = ("user_info", "chat_history")
+    latency = 0.08
+
     async def call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        await asyncio.sleep(0.08)
+        await asyncio.sleep(self.sample_latency())
+        return self._respond(payload)
+
+    async def call_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One round trip for the whole batch.
+        await asyncio.sleep(self.sample_latency())
+        return [self._respond(p) for p in payloads]
 
-        
+    def _respond(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         ok, missing = check_required({"required": ["topic"]}, payload)
         if not ok:
             return {"error": f"Missing fields for note_maker: {missing}"}
@@ -1,10 +1,13 @@
 from dotenv import load_dotenv
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 from langchain_openai import OpenAI
 
+from src.conversation import ConversationText
+from src.keywords import agent_keywords, tag
+
 
 load_dotenv()
 
@@ -30,22 +33,16 @@ class TutorAgent:
             self.llm = OpenAI(temperature=0.5, openai_api_key=api_key)
 
     def choose_tools(
-        self, chat_history: List[Dict[str, str]], latest_message: str
+        self,
+        chat_history: List[Dict[str, str]],
+        latest_message: str,
+        conversation: Optional[ConversationText] = None,
     ) -> List[str]:
         """
         Decide which tools to use based on chat history and latest message.
         Simple keyword-based selection; can be extended with LangGraph or RAG.
         """
-        text = " ".join([m.get("content") or "" for m in chat_history] + [latest_message or ""]).lower()
-        tools = []
-
-        if "flashcard" in text:
-            tools.append("flashcard_generator")
-        if "note" in text or "notes" in text:
-            tools.append("note_maker")
-        if "explain" in text or "concept" in text:
-            tools.append("concept_explainer")
-
-        return tools
+        tags = ConversationText.ensure(conversation, chat_history, latest_message).keyword_tags
+        return [tool for tool in agent_keywords() if tag("agent", tool) in tags]
 
     
\ No newline at end of file
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+# TOOL_BATCH_SIZE=1 (the default) sends every call on its own.
+DEFAULT_BATCH_SIZE = int(os.getenv("TOOL_BATCH_SIZE", "1"))
+DEFAULT_BATCH_WAIT_MS = float(os.getenv("TOOL_BATCH_WAIT_MS", "5"))
+
+
+class BatchingQueue:
+    """
+    Collects calls for one adapter and sends them as a single `call_batch`
+    once `max_size` payloads are waiting or the oldest one has waited
+    `max_wait` seconds. Each caller gets back the result for its own payload.
+    """
+
+    def __init__(self, adapter, max_size: int = DEFAULT_BATCH_SIZE, max_wait: float = DEFAULT_BATCH_WAIT_MS / 1000):
+        self.adapter = adapter
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.stats = {"batches": 0, "items": 0}
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        try:
+            results = await self.adapter.call_batch([payload for payload, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"call_batch returned {len(results)} results for {len(batch)} payloads")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # The caller may have been cancelled while the batch was running.
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,89 @@
+import math
+import os
+from typing import Dict, List, Optional
+
+# Default policy for the chat_history shipped in tool payloads; 0 disables a limit.
+DEFAULT_CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+DEFAULT_CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "8000"))
+DEFAULT_CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "0"))
+# The most recent user messages are kept even when they exceed the budget.
+DEFAULT_CONTEXT_KEEP_USER_TURNS = int(os.getenv("CONTEXT_KEEP_USER_TURNS", "2"))
+
+# Rough token estimate for budgeting; no tokenizer is involved.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class ContextWindow:
+    """
+    Chooses which chat_history messages a tool payload carries: the newest
+    messages, at most `max_messages`, while their content fits `max_chars`
+    and `max_tokens`. The last `keep_user_turns` user messages inside the
+    message limit are always kept. Order is preserved.
+    """
+    __slots__ = ("max_messages", "max_chars", "max_tokens", "keep_user_turns")
+
+    def __init__(
+        self,
+        max_messages: int = DEFAULT_CONTEXT_MAX_MESSAGES,
+        max_chars: int = DEFAULT_CONTEXT_MAX_CHARS,
+        max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS,
+        keep_user_turns: int = DEFAULT_CONTEXT_KEEP_USER_TURNS,
+    ):
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.keep_user_turns = keep_user_turns
+
+    def key(self) -> tuple:
+        return (self.max_messages, self.max_chars, self.max_tokens, self.keep_user_turns)
+
+    def apply(self, chat_history: Optional[List[Dict[str, Optional[str]]]]) -> List[Dict[str, Optional[str]]]:
+        history = chat_history or []
+        if self.max_messages > 0:
+            history = history[-self.max_messages:]
+
+        kept = []
+        chars = tokens = 0
+        user_turns = 0
+        within_budget = True
+        for message in reversed(history):
+            content = message.get("content") or ""
+            forced = message.get("role") == "user" and user_turns < self.keep_user_turns
+            if message.get("role") == "user":
+                user_turns += 1
+            if within_budget:
+                chars += len(content)
+                tokens += estimate_tokens(content) if self.max_tokens > 0 else 0
+                within_budget = (self.max_chars <= 0 or chars <= self.max_chars) and (
+                    self.max_tokens <= 0 or tokens <= self.max_tokens
+                )
+            if within_budget or forced:
+                kept.append(message)
+            elif user_turns >= self.keep_user_turns:
+                break
+        kept.reverse()
+        return kept
+
+
+class ContextWindows:
+    """
+    Trimmed chat_history views for one request, computed once per distinct
+    policy and shared by every tool using that policy.
+    """
+
+    def __init__(self, chat_history: Optional[List[Dict[str, Optional[str]]]]):
+        self.chat_history = chat_history or []
+        self._views: Dict[tuple, List[Dict[str, Optional[str]]]] = {}
+
+    def view(self, window: Optional[ContextWindow]) -> List[Dict[str, Optional[str]]]:
+        if window is None:
+            return self.chat_history
+        key = window.key()
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = window.apply(self.chat_history)
+        return view
@@ -0,0 +1,225 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from functools import cached_property
+from typing import Dict, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+from src.keyword_matcher import KeywordHit, KeywordMatcher
+from src.keywords import keyword_matcher
+
+
+class TextMatch(NamedTuple):
+    """Position and groups of a regex match in ConversationText.text."""
+    start: int
+    end: int
+    groups: Tuple[Optional[str], ...]
+
+    def group(self, index: int = 0) -> Optional[str]:
+        return self.groups[index]
+
+
+def _text_match(m) -> Optional[TextMatch]:
+    return TextMatch(m.start(), m.end(), (m.group(0),) + m.groups()) if m else None
+
+
+class ConversationText:
+    """
+    Normalized view of a request's conversation, built once per request and
+    shared by tool selection, context analysis, extraction and scoring.
+
+    - messages: lowercased content of each history message, latest message last
+    - text: all messages joined with single spaces
+    - offsets: start position of each message within `text`
+
+    Keyword hits, tags and `search` results are computed on first use. After
+    that, append/drop_first keep them up to date by scanning only the end of
+    the text, with the same results as a full rescan; a session's conversation
+    therefore costs O(new message) per turn instead of O(history).
+    """
+
+    def __init__(self, chat_history: Optional[List[Dict[str, Optional[str]]]], latest_message: Optional[str]):
+        self.latest_message = latest_message or ""
+        self.messages: List[str] = [(m.get("content") or "").lower() for m in (chat_history or [])]
+        self.messages.append(self.latest_message.lower())
+
+        self.offsets: List[int] = []
+        pos = 0
+        for msg in self.messages:
+            self.offsets.append(pos)
+            pos += len(msg) + 1
+        self.text = " ".join(self.messages)
+        self._init_analysis()
+
+    def _init_analysis(self):
+        self._matcher: Optional[KeywordMatcher] = None
+        self._hits: Optional[List[KeywordHit]] = None
+        self._tag_counts: Optional[Counter] = None
+        self._keyword_tags: Optional[Set[str]] = None
+        self._message_tags: Optional[List[Set[str]]] = None
+        # pattern -> [tail, first match]
+        self._searches: Dict[Pattern, list] = {}
+
+    @classmethod
+    def from_messages(cls, chat_history: Optional[List[Dict[str, Optional[str]]]]) -> "ConversationText":
+        """Conversation over `chat_history` alone; its last message plays the latest one."""
+        conversation = cls.__new__(cls)
+        conversation.latest_message = ""
+        conversation.messages = []
+        conversation.offsets = []
+        conversation.text = ""
+        conversation._init_analysis()
+        for m in chat_history or []:
+            conversation.append(m.get("content"))
+        return conversation
+
+    @classmethod
+    def ensure(cls, conversation: Optional["ConversationText"], chat_history, latest_message) -> "ConversationText":
+        """Returns `conversation` if given, otherwise builds one from the raw inputs."""
+        if conversation is not None:
+            return conversation
+        return cls(chat_history, latest_message)
+
+    def append(self, content: Optional[str]):
+        """Adds a message at the end; it becomes the latest message."""
+        content = content or ""
+        message = content.lower()
+        old_end = len(self.text) if self.messages else 0
+        self.offsets.append(old_end + 1 if self.messages else 0)
+        self.text = f"{self.text} {message}" if self.messages else message
+        self.messages.append(message)
+        self.latest_message = content
+        self.__dict__.pop("tokens", None)
+
+        if self._hits is not None and self._current_matcher() is self._matcher:
+            self._extend_hits(old_end)
+        for pattern, entry in self._searches.items():
+            tail, match = entry
+            resume = self._tail_start(tail, len(self.messages) - 1)
+            if match is None or match.end >= resume:
+                start = resume if match is None else min(resume, match.start)
+                entry[1] = _text_match(pattern.search(self.text, start))
+
+    def drop_first(self, count: int = 1):
+        """Forgets the `count` oldest messages (e.g. when a bounded history evicts them)."""
+        if count <= 0:
+            return
+        cut = self.offsets[count] if count < len(self.messages) else len(self.text) + 1
+        self.messages = self.messages[count:]
+        self.offsets = [o - cut for o in self.offsets[count:]]
+        self.text = self.text[cut:]
+        self.__dict__.pop("tokens", None)
+
+        if self._hits is not None:
+            i = bisect_left(self._hits, cut, key=lambda hit: hit.start)
+            self._count_tags(self._hits[:i], -1)
+            self._hits = [hit._replace(start=hit.start - cut, end=hit.end - cut) for hit in self._hits[i:]]
+            if self._message_tags is not None:
+                self._message_tags = self._message_tags[count:]
+        for pattern, entry in self._searches.items():
+            match = entry[1]
+            if match is None:
+                continue
+            if match.start >= cut:
+                entry[1] = match._replace(start=match.start - cut, end=match.end - cut)
+            else:
+                entry[1] = _text_match(pattern.search(self.text))
+
+    def _extend_hits(self, old_end: int):
+        # Only hits starting within max_length of the old end can grow into the new message.
+        rescan = max(0, old_end - self._matcher.max_length + 1)
+        hits = self._hits
+        i = len(hits)
+        while i and hits[i - 1].start >= rescan:
+            i -= 1
+        self._count_tags(hits[i:], -1)
+        del hits[i:]
+        added = self._matcher.find_all(self.text, rescan)
+        hits.extend(added)
+        self._count_tags(added, 1)
+        if self._message_tags is not None:
+            start = self.offsets[-1]
+            end = start + len(self.messages[-1])
+            self._message_tags.append({t for hit in added if hit.start >= start and hit.end <= end for t in hit.tags})
+
+    def _current_matcher(self) -> KeywordMatcher:
+        """The registry's matcher; keyword results found with an older one are dropped."""
+        matcher = keyword_matcher()
+        if matcher is not self._matcher:
+            self._matcher = matcher
+            self._hits = self._tag_counts = self._keyword_tags = self._message_tags = None
+        return matcher
+
+    def _count_tags(self, hits: List[KeywordHit], sign: int):
+        if self._tag_counts is None or not hits:
+            return
+        for hit in hits:
+            for t in hit.tags:
+                self._tag_counts[t] += sign
+                if not self._tag_counts[t]:
+                    del self._tag_counts[t]
+        self._keyword_tags = None
+
+    def _tail_start(self, tail: Pattern, before: int) -> int:
+        """Start of the suffix of messages[:before] that `tail` says a match could begin in."""
+        for i in range(before - 1, -1, -1):
+            m = tail.search(self.messages[i])
+            if m is None:
+                return self.offsets[i] + len(self.messages[i])
+            if m.start() > 0:
+                return self.offsets[i] + m.start()
+        return 0
+
+    @property
+    def history_messages(self) -> List[str]:
+        return self.messages[:-1]
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return self.text.split()
+
+    @property
+    def keyword_hits(self) -> List[KeywordHit]:
+        """Every keyword occurrence in `text`, found in a single pass."""
+        matcher = self._current_matcher()
+        if self._hits is None:
+            self._hits = matcher.find_all(self.text)
+        return self._hits
+
+    @property
+    def keyword_tags(self) -> Set[str]:
+        self._current_matcher()
+        if self._keyword_tags is None:
+            if self._tag_counts is None:
+                self._tag_counts = Counter(t for hit in self.keyword_hits for t in hit.tags)
+            self._keyword_tags = set(self._tag_counts)
+        return self._keyword_tags
+
+    @property
+    def message_tags(self) -> List[Set[str]]:
+        """Keyword tags per message, ignoring hits that span a message boundary."""
+        self._current_matcher()
+        if self._message_tags is None:
+            per_message: List[Set[str]] = [set() for _ in self.messages]
+            for hit in self.keyword_hits:
+                i = self.message_index(hit.start)
+                if hit.end <= self.offsets[i] + len(self.messages[i]):
+                    per_message[i].update(hit.tags)
+            self._message_tags = per_message
+        return self._message_tags
+
+    def search(self, pattern: Pattern, tail: Pattern) -> Optional[TextMatch]:
+        """
+        First match of `pattern` in `text` (like pattern.search(text)), kept up
+        to date by append/drop_first without rescanning the whole text.
+
+        `tail` must match, at the end of any message, every suffix an
+        unfinished match of `pattern` could start in, e.g. a partial keyword
+        plus whitespace. `pattern` must not use lookbehind or anchors.
+        """
+        entry = self._searches.get(pattern)
+        if entry is None:
+            entry = self._searches[pattern] = [tail, _text_match(pattern.search(self.text))]
+        return entry[1]
+
+    def message_index(self, pos: int) -> int:
+        """Returns the index of the message containing position `pos` of `text`."""
+        return bisect_right(self.offsets, pos) - 1
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Optional
+
+# Time budget for one request when the client sends no X-Request-Deadline-Ms; 0 disables it.
+DEFAULT_REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "10000"))
+# /orchestrate/batch is offline bulk work: without the header it has no deadline by default.
+DEFAULT_BATCH_DEADLINE_MS = float(os.getenv("BATCH_DEADLINE_MS", "0"))
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before this step finished."""
+
+
+class Deadline:
+    """
+    Absolute point in time (monotonic clock) by which a request must be done.
+    Passed down the pipeline so every stage can check it and bound its awaits.
+    """
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: Optional[float] = None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after_ms(cls, budget_ms: Optional[float]) -> "Deadline":
+        if not budget_ms or budget_ms <= 0:
+            return cls(None)
+        return cls(time.monotonic() + budget_ms / 1000)
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default_ms: float = DEFAULT_REQUEST_DEADLINE_MS) -> "Deadline":
+        """Builds a deadline from the remaining budget in ms sent by the client, or the default."""
+        try:
+            budget_ms = float(value) if value not in (None, "") else default_ms
+        except ValueError:
+            budget_ms = default_ms
+        return cls.after_ms(budget_ms)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, never negative; None when there is no deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, what: str = "request"):
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+    async def run(self, awaitable: Awaitable[Any], what: str = "request") -> Any:
+        """Awaits `awaitable`, cancelling it and raising DeadlineExceeded once the deadline passes."""
+        if self.expires_at is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+DEFAULT_LATENCY_WINDOW = int(os.getenv("TOOL_LATENCY_WINDOW", "512"))
+
+
+class LatencyHistogram:
+    """Rolling window of the most recent successful call latencies (seconds)."""
+
+    def __init__(self, window: int = DEFAULT_LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank percentile (0-100) of the window, or None while empty."""
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        rank = min(len(self._sorted) - 1, max(0, int(round(p / 100 * len(self._sorted))) - 1))
+        return self._sorted[rank]
+
+
+class HedgePolicy:
+    """
+    Starts a second identical call when the first has not finished after the
+    `percentile` latency of the adapter's recent calls (never sooner than
+    `min_delay` seconds). Inactive until `min_samples` latencies are recorded.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, min_delay: float = 0.005):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+    def delay(self, histogram: LatencyHistogram) -> Optional[float]:
+        if len(histogram) < self.min_samples:
+            return None
+        return max(self.min_delay, histogram.percentile(self.percentile))
+
+
+async def hedged(
+    attempt: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    stats: Dict[str, int],
+) -> Any:
+    """
+    Runs `attempt()`, and once more if the first has not finished within
+    `delay` seconds. The first attempt to succeed wins and the other is
+    cancelled; if both fail, the first attempt's error is raised.
+    """
+    if delay is None:
+        return await attempt()
+
+    primary = asyncio.ensure_future(attempt())
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        stats["hedges_fired"] += 1
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is hedge:
+                            stats["hedges_won"] += 1
+                        return task.result()
+            # Both failed.
+            return primary.result()
+        finally:
+            hedge.cancel()
+    finally:
+        primary.cancel()
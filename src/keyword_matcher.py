@@ -0,0 +1,75 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, FrozenSet, Set
+
+
+class KeywordHit(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    tags: FrozenSet[str]
+
+
+class KeywordMatcher:
+    """
+    Finds every occurrence of every keyword in one pass over the text.
+
+    The keywords are compiled into a single trie-shaped regex wrapped in a
+    lookahead, so the engine tests each text position once against the trie
+    (cost bounded by keyword length, not keyword count) and reports the
+    longest keyword starting there. Shorter keywords starting at the same
+    position are exactly the prefixes of that match, which are precomputed,
+    so the result matches plain substring (`kw in text`) semantics,
+    overlaps included.
+    """
+
+    def __init__(self, table: Dict[str, Iterable[str]]):
+        tags_by_keyword: Dict[str, Set[str]] = {}
+        for tag, keywords in table.items():
+            for kw in keywords:
+                kw = kw.lower()
+                if kw:
+                    tags_by_keyword.setdefault(kw, set()).add(tag)
+
+        self._tags: Dict[str, FrozenSet[str]] = {kw: frozenset(t) for kw, t in tags_by_keyword.items()}
+        # A hit starting more than this many characters before the end of a text
+        # cannot change when the text is extended.
+        self.max_length = max(map(len, self._tags), default=0)
+        self._prefixes: Dict[str, List[str]] = {
+            kw: [kw[:i] for i in range(len(kw), 0, -1) if kw[:i] in self._tags] for kw in self._tags
+        }
+
+        trie: Dict[str, dict] = {}
+        for kw in self._tags:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        self._regex = re.compile("(?=(" + self._trie_pattern(trie) + "))") if trie else None
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + cls._trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        is_word = "" in node
+        if len(branches) == 1 and not is_word:
+            return branches[0]
+        # Greedy optional group: prefer the longer keyword, fall back to the one ending here.
+        return "(?:" + "|".join(branches) + (")?" if is_word else ")")
+
+    def find_all(self, text: str, pos: int = 0) -> List[KeywordHit]:
+        """
+        Returns every keyword occurrence in `text` (already lowercased) starting
+        at or after `pos`, ordered by start position, longest keyword first.
+        """
+        if self._regex is None:
+            return []
+        hits = []
+        for m in self._regex.finditer(text, pos):
+            start = m.start()
+            for kw in self._prefixes[m.group(1)]:
+                hits.append(KeywordHit(start, start + len(kw), kw, self._tags[kw]))
+        return hits
+
+    def tags(self, text: str) -> Set[str]:
+        return {tag for hit in self.find_all(text) for tag in hit.tags}
@@ -0,0 +1,69 @@
+from typing import Dict, List
+
+from src.keyword_matcher import KeywordMatcher
+from src.tool_registry import tool_registry
+
+# Declarative keyword tables. Every table is compiled into one shared
+# KeywordMatcher, so routing cost does not grow with the number of entries.
+# Tool keywords are declared per tool in src/tool_registry.py and read from
+# the registry on each use, so the matcher picks up tools registered later.
+
+
+def tool_keywords() -> Dict[str, List[str]]:
+    """Context analysis routing: tool -> keywords."""
+    return tool_registry.routing_keywords()
+
+
+def agent_keywords() -> Dict[str, List[str]]:
+    """TutorAgent.choose_tools: tool -> keywords, in selection order."""
+    return tool_registry.agent_keywords()
+
+
+HELP_PHRASES = [
+    "help me with", "i'm struggling with", "i cant", "i can't", "i don't understand", "i do not understand",
+]
+
+# Extraction heuristics.
+DIFFICULTY_KEYWORDS: Dict[str, List[str]] = {
+    "easy": ["easy"],
+    "medium": ["medium"],
+    "hard": ["hard"],
+}
+
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "help": HELP_PHRASES,
+    "struggle": ["struggling", "can't", "cannot", "don't understand", "confused", "hard"],
+    "challenge": ["practice", "challenge", "challenging", "harder"],
+    "practice": ["practice", "problems", "flashcards"],
+    "tool_mention": ["flashcard", "note", "explain"],
+}
+
+# Subject detection: name -> (keywords, fields set on the payload), applied in order.
+SUBJECT_RULES: Dict[str, tuple] = {
+    "calculus": (["calculus"], {"subject": "calculus"}),
+    "photosynthesis": (["photosynthesis", "photosynth"], {"topic": "photosynthesis", "subject": "biology"}),
+}
+
+
+def tag(group: str, name: str) -> str:
+    return f"{group}:{name}"
+
+
+def build_keyword_table() -> Dict[str, List[str]]:
+    table: Dict[str, List[str]] = {}
+    for group, entries in (
+        ("route", tool_keywords()),
+        ("agent", agent_keywords()),
+        ("difficulty", DIFFICULTY_KEYWORDS),
+        ("intent", INTENT_KEYWORDS),
+    ):
+        for name, keywords in entries.items():
+            table[tag(group, name)] = keywords
+    for name, (keywords, _) in SUBJECT_RULES.items():
+        table[tag("subject", name)] = keywords
+    return table
+
+
+def keyword_matcher() -> KeywordMatcher:
+    """The matcher over every table, rebuilt after the tool registry changes."""
+    return tool_registry.cached("keyword_matcher", lambda: KeywordMatcher(build_keyword_table()))
@@ -1,20 +1,38 @@
 from dotenv import load_dotenv
+import copy
 import os
 import datetime
+import json
 import logging
+import time
 import traceback
+import uuid
 from typing import List, Dict, Any, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
+from src.conversation import ConversationText
+from src.deadline import DEFAULT_BATCH_DEADLINE_MS, Deadline
+from src.keywords import tag
+from src.metrics import (
+    METRICS_ENABLED,
+    SERVER_TIMING_ENABLED,
+    render_samples,
+    request_timings,
+    server_timing_header,
+    stage_metrics,
+)
 from src.orchestrator import Orchestrator
+from src.sessions import SessionStore
+from src.request_logging import Fields, configure_logging, history_stats, should_dump_payloads, stop_logging
 from src.state_manager import StateManager
 
 load_dotenv()
 
-#
-logging.basicConfig(level=logging.INFO)
+# Log records are formatted and written by a background thread (LOG_LEVEL, LOG_PAYLOAD_SAMPLE_RATE).
+configure_logging()
 logger = logging.getLogger("ai_tutor_orchestrator")
 
 
@@ -27,6 +45,7 @@ app = FastAPI(
 
 state = StateManager()
 orch = Orchestrator()
+sessions = SessionStore(orch.state)
 
 
 class ChatInput(BaseModel):
@@ -44,51 +63,323 @@ class OrchestratorOutput(BaseModel):
     payloads: Dict[str, ToolPayload]
     tool_responses: Dict[str, Any]
     clarify_question: Optional[str] = None
+    timed_out_tools: List[str] = []
+
+class SessionOpen(BaseModel):
+    user_info: Dict[str, Any]
+    chat_history: Optional[List[Dict[str, Optional[str]]]] = None
+
+class SessionInfo(BaseModel):
+    session_id: str
+    history_messages: int
 
+class SessionTurn(BaseModel):
+    latest_message: str
+    new_messages: List[Dict[str, Optional[str]]] = []
+    user_info: Dict[str, Any] = {}
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[OrchestratorOutput] = None
+    error: Optional[Dict[str, Any]] = None
 
-def calculate_confidence(chat_history: List[Dict[str, Optional[str]]], latest_message: str) -> float:
+
+def calculate_confidence(
+    chat_history: List[Dict[str, Optional[str]]],
+    latest_message: str,
+    conversation: Optional[ConversationText] = None,
+) -> float:
     """
     Example confidence: base 0.5, +0.1 for each keyword matched or message length.
     """
+    conversation = ConversationText.ensure(conversation, chat_history, latest_message)
     base_conf = 0.5
     length_factor = min(len(latest_message) / 100, 0.2) if latest_message else 0
-    keyword_factor = sum(0.05 for msg in chat_history if msg.get("content") and any(k in msg["content"].lower() for k in ["flashcard","note","explain"]))
+    mention = tag("intent", "tool_mention")
+    keyword_factor = sum(0.05 for tags in conversation.message_tags[:-1] if mention in tags)
     return min(base_conf + length_factor + keyword_factor, 0.95)
 
 
+async def add_server_timing(request: Request, call_next):
+    """
+    Reports the request's pipeline stage timings in a Server-Timing header.
+    /orchestrate/stream sends its headers before any stage runs, so it gets
+    no header and reports its timings in a final "server_timing" event.
+    """
+    timings = []
+    token = request_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+if METRICS_ENABLED and SERVER_TIMING_ENABLED:
+    app.middleware("http")(add_server_timing)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await sessions.close_all()
+    await orch.wait_for_saves()
+    await orch.state.close()
+    stop_logging()
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
 @app.post("/orchestrate", response_model=OrchestratorOutput)
-async def orchestrate(inp: ChatInput):
+async def orchestrate(
+    inp: ChatInput,
+    x_request_deadline_ms: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+):
     """
     Main endpoint: returns orchestration result including:
       - selected tools
       - extracted payloads
       - tool responses (mocked)
       - clarify_question (optional)
+      - timed_out_tools: tools cut off by the request deadline
+        (X-Request-Deadline-Ms header, else REQUEST_DEADLINE_MS)
     """
+    deadline = Deadline.from_header(x_request_deadline_ms)
+    request_id = x_request_id or uuid.uuid4().hex
+    user_id = inp.user_info.get("user_id")
+    start = time.perf_counter()
     try:
-        logger.info("Received input: %s", inp.dict())
+        state.upsert_user(inp.user_info)
+        result = await orch.handle_chat(inp.user_info, inp.chat_history, inp.latest_message, deadline=deadline)
+
+    except Exception as e:
+        trace = traceback.format_exc()
+        logger.error("%s", Fields(
+            event="orchestrate_error", request_id=request_id, user_id=user_id,
+            error=str(e), duration_ms=_elapsed_ms(start),
+        ))
+        logger.debug("%s", trace)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error_code": "ORCHESTRATOR_FAILURE",
+                "message": str(e),
+                "trace": trace
+            }
+        )
+
+    logger.info("%s", Fields(
+        event="orchestrate", request_id=request_id, user_id=user_id,
+        **history_stats(inp.chat_history), latest_chars=len(inp.latest_message),
+        tools=list(result["selected_tools"]), timed_out=list(result["timed_out_tools"]),
+        clarify=result["clarify_question"] is not None, duration_ms=_elapsed_ms(start),
+    ))
+    if should_dump_payloads(logger):
+        logger.info("%s", Fields(event="orchestrate_payload", request_id=request_id, input=inp.dict(), result=copy.deepcopy(result)))
+    return result
+
+@app.post("/orchestrate/stream")
+async def orchestrate_stream(
+    inp: ChatInput,
+    x_request_deadline_ms: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+):
+    """
+    Streaming variant of /orchestrate (NDJSON, one event per line):
+      - {"event": "analysis", ...} as soon as tools are selected
+      - {"event": "tool_result", ...} per tool, in completion order
+      - {"event": "clarify", ...} if a tool needs more information
+      - {"event": "summary", ...}
+      - {"event": "server_timing", "server_timing": ...} last, with
+        SERVER_TIMING_ENABLED (in the Server-Timing header format)
+    Errors after the stream has started arrive as {"event": "error", ...}.
+    """
+    deadline = Deadline.from_header(x_request_deadline_ms)
+    request_id = x_request_id or uuid.uuid4().hex
+    user_id = inp.user_info.get("user_id")
+    start = time.perf_counter()
+
+    async def events():
+        summary: Dict[str, Any] = {}
+        stage_timings = None
+        if METRICS_ENABLED and SERVER_TIMING_ENABLED:
+            # Collected here rather than by the middleware, which has already sent the headers.
+            stage_timings = []
+            request_timings.set(stage_timings)
+        stream = orch.stream_chat(inp.user_info, inp.chat_history, inp.latest_message, deadline=deadline)
+        try:
+            state.upsert_user(inp.user_info)
+            async for event in stream:
+                if event["event"] == "summary":
+                    summary = event
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            logger.error("%s", Fields(
+                event="orchestrate_stream_error", request_id=request_id, user_id=user_id,
+                error=str(e), duration_ms=_elapsed_ms(start),
+            ))
+            logger.debug("%s", traceback.format_exc())
+            yield json.dumps({"event": "error", "error_code": "ORCHESTRATOR_FAILURE", "message": str(e)}) + "\n"
+            return
+        finally:
+            # Also runs when the client disconnects: stops pending tool calls
+            # and lets stream_chat finish its profile save.
+            await stream.aclose()
+        logger.info("%s", Fields(
+            event="orchestrate_stream", request_id=request_id, user_id=user_id,
+            **history_stats(inp.chat_history), latest_chars=len(inp.latest_message),
+            tools=list(summary.get("selected_tools") or []), timed_out=list(summary.get("timed_out_tools") or []),
+            duration_ms=_elapsed_ms(start),
+        ))
+        if stage_timings:
+            yield json.dumps({"event": "server_timing", "server_timing": server_timing_header(stage_timings)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
-        
+
+@app.post("/orchestrate/batch", response_model=List[BatchItemResult])
+async def orchestrate_batch(
+    items: List[ChatInput],
+    x_request_deadline_ms: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+):
+    """
+    Bulk variant of /orchestrate for offline replay and pre-generation.
+    Turns run concurrently (bounded by BATCH_MAX_CONCURRENCY); results and
+    per-item errors come back in input order.
+    REQUEST_DEADLINE_MS does not apply here: a bulk job only gets a deadline
+    from X-Request-Deadline-Ms (or BATCH_DEADLINE_MS), and it covers the whole batch.
+    """
+    deadline = Deadline.from_header(x_request_deadline_ms, DEFAULT_BATCH_DEADLINE_MS)
+    request_id = x_request_id or uuid.uuid4().hex
+    start = time.perf_counter()
+    for inp in items:
         state.upsert_user(inp.user_info)
-        logger.info("State updated for user: %s", inp.user_info.get("user_id"))
 
-        
-        result = await orch.handle_chat(inp.user_info, inp.chat_history, inp.latest_message)
-        logger.info("Orchestration result: %s", result)
+    try:
+        results = await orch.handle_batch([inp.dict() for inp in items], deadline=deadline)
+    except Exception as e:
+        logger.error("%s", Fields(
+            event="orchestrate_batch_error", request_id=request_id, turns=len(items),
+            error=str(e), duration_ms=_elapsed_ms(start),
+        ))
+        logger.debug("%s", traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error_code": "BATCH_FAILURE",
+                "message": str(e),
+            }
+        )
+    logger.info("%s", Fields(
+        event="orchestrate_batch", request_id=request_id, turns=len(items),
+        errors=sum(1 for item in results if "error" in item), duration_ms=_elapsed_ms(start),
+    ))
+    return [{"index": i, **item} for i, item in enumerate(results)]
+
+
+@app.post("/sessions", response_model=SessionInfo)
+async def open_session(inp: SessionOpen):
+    """
+    Opens a server-side conversation. Without chat_history the user's stored
+    conversation is resumed. Turns then go to /sessions/{session_id}/turns.
+    """
+    state.upsert_user(inp.user_info)
+    session = await sessions.open(inp.user_info, inp.chat_history)
+    return {"session_id": session.session_id, "history_messages": len(session.history)}
 
-        return result
 
+@app.post("/sessions/{session_id}/turns", response_model=OrchestratorOutput)
+async def session_turn(
+    session_id: str,
+    inp: SessionTurn,
+    x_request_deadline_ms: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+):
+    """
+    /orchestrate for an open session: send only latest_message, plus any
+    messages exchanged since the previous turn in new_messages (e.g. the
+    tutor's reply). The server keeps the last SESSION_MAX_MESSAGES messages.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail={"error_code": "SESSION_NOT_FOUND", "message": session_id})
+    deadline = Deadline.from_header(x_request_deadline_ms)
+    request_id = x_request_id or uuid.uuid4().hex
+    start = time.perf_counter()
+    try:
+        result = await orch.handle_session_turn(
+            session, inp.latest_message, inp.new_messages, inp.user_info, deadline=deadline
+        )
     except Exception as e:
-        logger.error("Orchestrator error: %s", str(e))
-        logger.debug(traceback.format_exc())
+        logger.error("%s", Fields(
+            event="session_turn_error", request_id=request_id, session_id=session_id,
+            user_id=session.user_id, error=str(e), duration_ms=_elapsed_ms(start),
+        ))
+        logger.debug("%s", traceback.format_exc())
         raise HTTPException(
             status_code=500,
             detail={
                 "error_code": "ORCHESTRATOR_FAILURE",
                 "message": str(e),
-                "trace": traceback.format_exc()
             }
         )
+    logger.info("%s", Fields(
+        event="session_turn", request_id=request_id, session_id=session_id, user_id=session.user_id,
+        history_messages=len(session.history), new_messages=len(inp.new_messages),
+        latest_chars=len(inp.latest_message), tools=list(result["selected_tools"]),
+        timed_out=list(result["timed_out_tools"]), duration_ms=_elapsed_ms(start),
+    ))
+    return result
+
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    """Closes a session and stores its history as the user's conversation_history."""
+    if not await sessions.close(session_id):
+        raise HTTPException(status_code=404, detail={"error_code": "SESSION_NOT_FOUND", "message": session_id})
+    return {"session_id": session_id, "closed": True}
+
+
+if METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """
+        Prometheus text format: pipeline stage histograms plus per-adapter
+        load, failure and hedge counters and tool cache counters.
+        """
+        tool_orch = orch.tool_orch
+        adapters = tool_orch.adapter_states()
+        per_adapter = lambda key: {tool: s[key] for tool, s in adapters.items()}
+        lines = stage_metrics.render()
+        for key, kind, help_text in (
+            ("in_flight", "gauge", "Adapter calls currently running."),
+            ("queued", "gauge", "Adapter calls waiting for a free slot."),
+            ("calls", "counter", "Adapter calls started."),
+            ("failures", "counter", "Adapter calls that raised or timed out."),
+            ("timeouts", "counter", "Adapter calls that timed out."),
+            ("rejected", "counter", "Adapter calls rejected because the queue was full."),
+            ("short_circuited", "counter", "Adapter calls rejected by an open circuit."),
+            ("hedges_fired", "counter", "Hedged second attempts started."),
+            ("hedges_won", "counter", "Hedged attempts that finished first."),
+        ):
+            lines += render_samples(f"orchestrator_adapter_{key}", kind, help_text, per_adapter(key))
+        lines += render_samples(
+            "orchestrator_adapter_circuit_open", "gauge", "1 while the adapter's circuit is not closed.",
+            {tool: int(s["state"] != "closed") for tool, s in adapters.items()},
+        )
+        cache_stats = dict(tool_orch.cache.stats) if tool_orch.cache is not None else {}
+        cache_stats["coalesced"] = tool_orch.stats["coalesced"]
+        lines += render_samples(
+            "orchestrator_tool_cache_events", "counter", "Tool response cache and coalescing events.",
+            cache_stats, label="event",
+        )
+        return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 
 @app.post("/mock/{tool_name}")
 async def mock_tool(tool_name: str, payload: Dict[str, Any]):
@@ -99,14 +390,15 @@ async def mock_tool(tool_name: str, payload: Dict[str, Any]):
         logger.info("🔹 Mock tool called: %s", tool_name)
         return {"tool": tool_name, "status": "ok", "echo": payload}
     except Exception as e:
+        trace = traceback.format_exc()
         logger.error("Mock tool error (%s): %s", tool_name, str(e))
-        logger.debug(traceback.format_exc())
+        logger.debug("%s", trace)
         raise HTTPException(
             status_code=500,
             detail={
                 "error_code": "MOCK_TOOL_FAILURE",
                 "message": str(e),
-                "trace": traceback.format_exc()
+                "trace": trace
             }
         )
 
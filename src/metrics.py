@@ -0,0 +1,123 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# METRICS_ENABLED=0 turns every timing hook into a no-op.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Adds a Server-Timing header with the request's stage timings.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") == "1"
+
+# Seconds; Prometheus-style cumulative buckets plus +Inf.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: one bisect and three increments per observation."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageMetrics:
+    """Histograms of pipeline stage durations, keyed by (stage, tool)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, stage: str, tool: Optional[str], seconds: float):
+        key = (stage, tool or "")
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def render(self, name: str = "orchestrator_stage_seconds") -> List[str]:
+        lines = [
+            f"# HELP {name} Time spent per orchestration pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        for (stage, tool), h in sorted(self.histograms.items()):
+            labels = f'stage="{stage}"' + (f',tool="{tool}"' if tool else "")
+            cumulative = 0
+            for bound, count in zip(self.buckets, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+            lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return lines
+
+
+stage_metrics = StageMetrics()
+
+# Per-request (stage, tool, seconds) list for Server-Timing; None outside a timed request.
+request_timings: ContextVar[Optional[List[Tuple[str, Optional[str], float]]]] = ContextVar("request_timings", default=None)
+
+
+def record(stage: str, tool: Optional[str], seconds: float):
+    stage_metrics.observe(stage, tool, seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, tool, seconds))
+
+
+class _Timer:
+    __slots__ = ("stage", "tool", "start")
+
+    def __init__(self, stage: str, tool: Optional[str]):
+        self.stage = stage
+        self.tool = tool
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, self.tool, time.perf_counter() - self.start)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage: str, tool: Optional[str] = None):
+    """`with timed("state_load"): ...` records the block's duration for `stage`."""
+    return _Timer(stage, tool) if METRICS_ENABLED else _NO_TIMER
+
+
+def server_timing_header(timings: Iterable[Tuple[str, Optional[str], float]]) -> str:
+    """Server-Timing value with durations in ms, summed per stage (and tool)."""
+    totals: Dict[str, float] = {}
+    for stage, tool, seconds in timings:
+        name = f"{stage}.{tool}" if tool else stage
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items())
+
+
+def render_samples(name: str, kind: str, help_text: str, samples: Dict[str, float], label: str = "tool") -> List[str]:
+    """Prometheus lines for one gauge or counter with a single label."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(samples.items()))
+    return lines
@@ -1,68 +1,173 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from src.context_analysis import analyze_context
+from src.context_window import ContextWindow, ContextWindows
+from src.conversation import ConversationText
+from src.deadline import Deadline, DeadlineExceeded
+from src.metrics import timed
 from src.parameter_extraction import generate_payload_for_tool
-from src.tool_orchestrator import ToolOrchestrator
-from src.state_postgres import PostgresStateManager
+from src.tool_orchestrator import ToolOrchestrator, timeout_marker
+from src.state_postgres import AsyncPostgresStateManager
+from src.write_behind import WriteBehindStateManager
 from src.agents import TutorAgent
-from src.personalization import adjust_for_mastery, adjust_for_emotion, adjust_for_learning_style
+from src.personalization import personalize
+from src.profile_snapshot import ProfileSnapshot
+from src.sessions import Session
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+# Opt-in: profile writes are acknowledged before they reach the database (see WriteBehindStateManager).
+STATE_WRITE_BEHIND = os.getenv("STATE_WRITE_BEHIND", "0") == "1"
+
+logger = logging.getLogger("ai_tutor_orchestrator")
+
 
 class Orchestrator:
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None, context_window: Optional[ContextWindow] = None):
         self.tool_orch = ToolOrchestrator()
-        self.state = PostgresStateManager()  
+        self.state = AsyncPostgresStateManager()
+        if STATE_WRITE_BEHIND:
+            self.state = WriteBehindStateManager(self.state)
         self.agent = TutorAgent()  
+        # Upper bound on adapter calls running at once within a single request.
+        self.max_concurrency = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        # chat_history sent to tools that do not declare their own ToolSpec.context_window.
+        self.context_window = context_window or ContextWindow()
+        # Profile write-backs still running after their stream ended early.
+        self._pending_saves = set()
 
     async def handle_chat(
         self,
         user_info: Dict[str, Any],
         chat_history: List[Dict[str, str]],
         latest_message: str,
+        profile: Optional[ProfileSnapshot] = None,
+        save_profile: bool = True,
+        deadline: Optional[Deadline] = None,
+        conversation: Optional[ConversationText] = None,
     ) -> Dict[str, Any]:
         """
-        Orchestrator workflow:
-        1. Update user state in DB
-        2. Select tools via agent or context analysis
-        3. Generate payloads with validation and personalization
-        4. Call tool adapters
-        5. Handle low-confidence via clarifying questions
+        Runs a full turn and collects the stream_chat events into one result.
+        tool_responses keeps the selected_tools order; tools cut off by the
+        deadline get a timeout marker there and are listed in timed_out_tools.
         """
-        user_id = user_info.get("user_id")
-        previous_info = self.state.get_user(user_id) or {}
-        merged_user_info = {**previous_info, **user_info}
-        self.state.upsert_user(merged_user_info)
-
-        
-        selected_tools = self.agent.choose_tools(chat_history, latest_message)
-        if not selected_tools:
-            context_analysis = analyze_context(chat_history, latest_message)
-            selected_tools = context_analysis.get("tools", [])
-
         outputs = {
-            "selected_tools": selected_tools,
-            "analysis": {"agent_tools": selected_tools},
+            "selected_tools": [],
+            "analysis": {},
             "payloads": {},
             "tool_responses": {},
             "clarify_question": None,
+            "timed_out_tools": [],
         }
+        responses: Dict[str, Any] = {}
+        async for event in self.stream_chat(
+            user_info, chat_history, latest_message, profile, save_profile, deadline, conversation
+        ):
+            kind = event["event"]
+            if kind == "analysis":
+                outputs["selected_tools"] = event["selected_tools"]
+                outputs["analysis"] = event["analysis"]
+            elif kind in ("tool_result", "clarify"):
+                outputs["payloads"][event["tool"]] = {"payload": event["payload"], "confidence": event["confidence"]}
+                if kind == "tool_result":
+                    responses[event["tool"]] = event["response"]
+            elif kind == "summary":
+                outputs["clarify_question"] = event["clarify_question"]
+                outputs["timed_out_tools"] = event["timed_out_tools"]
+                for tool in event["timed_out_tools"]:
+                    responses.setdefault(tool, timeout_marker(tool))
+
+        selected = outputs["selected_tools"]
+        outputs["payloads"] = {t: outputs["payloads"][t] for t in selected if t in outputs["payloads"]}
+        outputs["tool_responses"] = {t: responses[t] for t in selected if t in responses}
+        return outputs
+
+    async def stream_chat(
+        self,
+        user_info: Dict[str, Any],
+        chat_history: List[Dict[str, str]],
+        latest_message: str,
+        profile: Optional[ProfileSnapshot] = None,
+        save_profile: bool = True,
+        deadline: Optional[Deadline] = None,
+        conversation: Optional[ConversationText] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Orchestrator workflow, emitted as events while it runs:
+        1. Load the user's profile once and merge the incoming user_info
+        2. Select tools via agent or context analysis     -> "analysis"
+        3. Generate payloads with validation and personalization; each payload's
+           chat_history is trimmed by the tool's context window
+        4. Handle low-confidence via clarifying questions -> "clarify"
+        5. Call tool adapters concurrently (capped by max_concurrency),
+           one event per tool as soon as it finishes      -> "tool_result"
+        6. Write the profile back only if it changed      -> "summary"
+
+        A preloaded `profile` (with user_info already merged) skips step 1;
+        save_profile=False leaves step 6 to the caller.
+
+        With a `deadline`, a profile load that runs out of time falls back to the
+        incoming user_info, and tools that cannot finish in time are reported in
+        the summary's timed_out_tools (with a timeout marker as their response).
+
+        A `conversation` already covering chat_history + latest_message (e.g. a
+        session's incrementally maintained one) is used instead of rebuilding it.
+        """
+        if profile is None:
+            try:
+                with timed("state_load"):
+                    profile = await ProfileSnapshot.load(self.state, user_info.get("user_id"), deadline)
+            except DeadlineExceeded:
+                profile = ProfileSnapshot(user_info.get("user_id"))
+            profile.update(user_info)
+        merged_user_info = profile.data
 
         
-        for tool in selected_tools:
+        with timed("tool_selection"):
+            conversation = ConversationText.ensure(conversation, chat_history, latest_message)
+            selected_tools = self.agent.choose_tools(chat_history, latest_message, conversation)
+            if not selected_tools:
+                context_analysis = analyze_context(chat_history, latest_message, conversation)
+                selected_tools = context_analysis.get("tools", [])
+
+        yield {
+            "event": "analysis",
+            "selected_tools": selected_tools,
+            "analysis": {"agent_tools": selected_tools},
+        }
+
+        clarify_question = None
+        timed_out: List[str] = []
+        prepared: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        ready_calls: List[Tuple[str, Dict[str, Any]]] = []
+        windows = ContextWindows(chat_history)
+        for i, tool in enumerate(selected_tools):
             schema = self.tool_orch.load_schema(tool)
+            tool_history = windows.view(self._context_window(tool))
 
-            
-            payload, confidence = await generate_payload_for_tool(
-                tool_name=tool,
-                schema=schema,
-                chat_history=chat_history,
-                latest_message=latest_message,
-                user_info=merged_user_info,
-                state=self.state,
-            )
+            try:
+                with timed("payload_generation", tool):
+                    payload, confidence = await generate_payload_for_tool(
+                        tool_name=tool,
+                        schema=schema,
+                        chat_history=tool_history,
+                        latest_message=latest_message,
+                        user_info=merged_user_info,
+                        state=self.state,
+                        conversation=conversation,
+                        profile=profile,
+                        deadline=deadline,
+                    )
+            except DeadlineExceeded:
+                timed_out.extend(selected_tools[i:])
+                break
 
             
             if tool == "concept_explainer":
                 payload.setdefault("user_info", merged_user_info)
-                payload.setdefault("chat_history", chat_history)
+                payload.setdefault("chat_history", tool_history)
                 payload.setdefault("concept_to_explain", latest_message)
                 payload.setdefault("current_topic", payload.get("topic", ""))
                 
@@ -75,29 +180,185 @@ class Orchestrator:
                     payload["desired_depth"] = "intermediate"  
 
            
-            payload = adjust_for_mastery(tool, payload, merged_user_info.get("mastery_level", 1))
-            payload = adjust_for_emotion(tool, payload, merged_user_info.get("emotional_state", "neutral"))
-            payload = adjust_for_learning_style(tool, payload, merged_user_info.get("learning_style", "visual"))
+            with timed("personalization", tool):
+                payload = personalize(tool, payload, profile)
 
             
-            missing_fields = self.tool_orch.check_missing_fields(tool, payload)
-            for f in list(missing_fields.keys()):
-                if f in previous_info:
-                    payload[f] = previous_info[f]
-                    del missing_fields[f]
-
-            outputs["payloads"][tool] = {"payload": payload, "confidence": confidence}
+            with timed("missing_fields", tool):
+                missing_fields = self.tool_orch.check_missing_fields(tool, payload)
+                # Backfill from the merged profile: the stored keys plus this request's
+                # user_info, so a field the client just sent is not asked for again.
+                for f in list(missing_fields.keys()):
+                    if f in merged_user_info:
+                        payload[f] = merged_user_info[f]
+                        del missing_fields[f]
 
             
             if missing_fields:
-                outputs["clarify_question"] = self.tool_orch.make_clarifying_question(
-                    tool, payload, schema
-                )
-                self.state.upsert_user(payload.get("user_info", {}))
-                return outputs
+                clarify_question = self.tool_orch.make_clarifying_question(tool, payload, schema)
+                yield {
+                    "event": "clarify",
+                    "tool": tool,
+                    "payload": payload,
+                    "confidence": confidence,
+                    "clarify_question": clarify_question,
+                }
+                break
 
-            
-            resp = await self.tool_orch.call_tool(tool, payload)
-            outputs["tool_responses"][tool] = resp
+            prepared[tool] = (payload, confidence)
+            ready_calls.append((tool, payload))
 
-        return outputs
+        # The write-back is not bound by the deadline, and it keeps running if the
+        # consumer stops early (e.g. a streaming client disconnects): dropping it
+        # would lose profile changes.
+        save = self._start_save(profile) if save_profile else None
+        completed: List[str] = []
+        async for tool, resp in self._iter_tool_calls(ready_calls, deadline):
+            payload, confidence = prepared[tool]
+            if resp.get("timed_out"):
+                timed_out.append(tool)
+            else:
+                completed.append(tool)
+            yield {
+                "event": "tool_result",
+                "tool": tool,
+                "payload": payload,
+                "confidence": confidence,
+                "response": resp,
+            }
+        if save is not None:
+            await asyncio.shield(save)
+
+        yield {
+            "event": "summary",
+            "selected_tools": selected_tools,
+            "completed_tools": completed,
+            "timed_out_tools": [t for t in selected_tools if t in timed_out],
+            "clarify_question": clarify_question,
+        }
+
+    async def handle_batch(
+        self,
+        turns: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs many turns ({"user_info", "chat_history", "latest_message"}) concurrently.
+        All involved profiles are loaded in one query and the changed ones are written
+        back together at the end. Turns for the same user see each other's user_info
+        in input order, as if sent one after another.
+        Returns one {"result": ...} or {"error": {...}} per turn, in input order.
+        `deadline` applies to the whole batch.
+        """
+        user_ids = list(dict.fromkeys(
+            t["user_info"].get("user_id") for t in turns if t["user_info"].get("user_id")
+        ))
+        load = self.state.get_users(user_ids)
+        try:
+            stored = await (deadline.run(load, "loading profiles") if deadline is not None else load)
+        except DeadlineExceeded:
+            stored = {}
+
+        running: Dict[str, Dict[str, Any]] = {uid: stored.get(uid) or {} for uid in user_ids}
+        snapshots: List[ProfileSnapshot] = []
+        for turn in turns:
+            uid = turn["user_info"].get("user_id")
+            snapshot = ProfileSnapshot(uid, running.get(uid))
+            snapshot.update(turn["user_info"])
+            if uid:
+                running[uid] = snapshot.data
+            snapshots.append(snapshot)
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or DEFAULT_BATCH_CONCURRENCY))
+
+        async def run(turn: Dict[str, Any], snapshot: ProfileSnapshot) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self.handle_chat(
+                        turn["user_info"], turn["chat_history"], turn["latest_message"],
+                        profile=snapshot, save_profile=False, deadline=deadline,
+                    )
+                    return {"result": result}
+                except Exception as e:
+                    return {"error": {"error_code": "ORCHESTRATOR_FAILURE", "message": str(e)}}
+
+        results = await asyncio.gather(*(run(t, s) for t, s in zip(turns, snapshots)))
+
+        changes = [{"user_id": s.user_id, **s.changes} for s in snapshots if s.user_id and s.changed]
+        if changes:
+            with timed("state_write"):
+                await self.state.upsert_many(changes)
+        return list(results)
+
+    async def handle_session_turn(
+        self,
+        session: Session,
+        latest_message: str,
+        new_messages: Optional[List[Dict[str, Optional[str]]]] = None,
+        user_info: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs a turn of a server-side session. Only the delta arrives: messages
+        exchanged since the last turn (e.g. the tutor's reply) and the latest
+        message. Both are appended to the session's bounded history and its
+        ConversationText, which the pipeline then reuses as is.
+        """
+        async with session.lock:
+            if user_info:
+                session.user_info.update(user_info)
+            for m in new_messages or []:
+                session.add(m.get("role") or "user", m.get("content"))
+            session.add("user", latest_message)
+            chat_history = list(session.history)[:-1]
+            return await self.handle_chat(
+                session.user_info, chat_history, latest_message,
+                deadline=deadline, conversation=session.conversation,
+            )
+
+    def _context_window(self, tool: str) -> ContextWindow:
+        spec = self.tool_orch.tools.get(tool)
+        return spec.context_window if spec is not None and spec.context_window is not None else self.context_window
+
+    def _start_save(self, profile: ProfileSnapshot) -> asyncio.Future:
+        save = asyncio.ensure_future(self._save_profile(profile))
+        self._pending_saves.add(save)
+        save.add_done_callback(self._save_done)
+        return save
+
+    def _save_done(self, save: asyncio.Future):
+        self._pending_saves.discard(save)
+        if not save.cancelled() and save.exception() is not None:
+            logger.error("Profile write-back failed: %s", save.exception())
+
+    async def wait_for_saves(self):
+        """Waits for profile write-backs detached from finished streams (shutdown)."""
+        if self._pending_saves:
+            await asyncio.gather(*self._pending_saves, return_exceptions=True)
+
+    async def _save_profile(self, profile: ProfileSnapshot) -> bool:
+        with timed("state_write"):
+            return await profile.save(self.state)
+
+    async def _iter_tool_calls(
+        self, calls: List[Tuple[str, Dict[str, Any]]], deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Runs the adapter calls together, at most max_concurrency at a time,
+        and yields (tool, response) pairs in completion order.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(tool: str, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+            async with semaphore:
+                return tool, await self.tool_orch.call_tool(tool, payload, deadline)
+
+        tasks = [asyncio.ensure_future(run(tool, payload)) for tool, payload in calls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer may stop early (e.g. a streaming client disconnects).
+            for task in tasks:
+                task.cancel()
@@ -1,20 +1,42 @@
 import json
-from typing import Dict, Any
-from pydantic import ValidationError, create_model
+from typing import Dict, Any, Optional, Type
+from pydantic import BaseModel, ValidationError, create_model
 import re
+from src.conversation import ConversationText
+from src.keywords import DIFFICULTY_KEYWORDS, SUBJECT_RULES, tag
+from src.deadline import Deadline
+from src.profile_snapshot import ProfileSnapshot
+from src.schema_registry import CompiledSchema, schema_registry
 
+# Matched against the whole conversation through ConversationText.search; each
+# *_TAIL covers the end of a message an unfinished match could start in.
+TOPIC_PATTERN = re.compile(r"(?:about|on|with|for)\s+([a-zA-Z0-9\s\-]+)")
+TOPIC_TAIL = re.compile(r"[a-z]*\s*$")
+COUNT_PATTERN = re.compile(r"(\d+)\s+(flashcards|questions|problems|cards)")
+COUNT_TAIL = re.compile(r"\d*\s*[a-z]*\s*$")
 
-def _llm_stub_generate(schema: Dict[str, Any], chat_history, latest_message, user_info) -> Dict[str, Any]:
+_validator_cache: Dict[str, Type[BaseModel]] = {}
+_validator_stats = {"hits": 0, "misses": 0}
+
+
+def _llm_stub_generate(
+    schema: Dict[str, Any],
+    chat_history,
+    latest_message,
+    user_info,
+    conversation: Optional[ConversationText] = None,
+) -> Dict[str, Any]:
     """
     Generates a JSON-like payload based on chat heuristics.
     Handles short inputs (like "Easy" or "5") and context from previous chat.
     """
-    text = " ".join([m.get("content", "") for m in (chat_history or [])] + [latest_message or ""]).lower()
+    conversation = ConversationText.ensure(conversation, chat_history, latest_message)
+    tags = conversation.keyword_tags
     payload = {}
     payload["_inferred_fields"] = []
 
     
-    m = re.search(r"(?:about|on|with|for)\s+([a-zA-Z0-9\s\-]+)", text)
+    m = conversation.search(TOPIC_PATTERN, TOPIC_TAIL)
     if m:
         payload["topic"] = m.group(1).strip()
         payload["_inferred_fields"].append("topic")
@@ -25,21 +47,16 @@ def _llm_stub_generate(schema: Dict[str, Any], chat_history, latest_message, use
             payload["_inferred_fields"].append("topic")
 
    
-    difficulty_map = {
-        "easy": "easy",
-        "medium": "medium",
-        "hard": "hard",
-    }
-    for key in difficulty_map.keys():
-        if key in text:
-            payload["difficulty"] = difficulty_map[key]
+    for level in DIFFICULTY_KEYWORDS:
+        if tag("difficulty", level) in tags:
+            payload["difficulty"] = level
             payload["_inferred_fields"].append("difficulty")
             break
     else:
-        if any(w in text for w in ["struggling", "can't", "cannot", "don't understand", "confused", "hard"]):
+        if tag("intent", "struggle") in tags:
             payload["difficulty"] = "easy"
             payload["_inferred_fields"].append("difficulty")
-        elif any(w in text for w in ["practice", "challenge", "challenging", "harder"]):
+        elif tag("intent", "challenge") in tags:
             payload["difficulty"] = "medium"
             payload["_inferred_fields"].append("difficulty")
 
@@ -51,7 +68,7 @@ def _llm_stub_generate(schema: Dict[str, Any], chat_history, latest_message, use
         payload["num_questions"] = count
         payload["_inferred_fields"].append("count")
     else:
-        m_num2 = re.search(r"(\d+)\s+(flashcards|questions|problems|cards)", text)
+        m_num2 = conversation.search(COUNT_PATTERN, COUNT_TAIL)
         if m_num2:
             count = int(m_num2.group(1))
             payload["count"] = count
@@ -59,19 +76,15 @@ def _llm_stub_generate(schema: Dict[str, Any], chat_history, latest_message, use
             payload["_inferred_fields"].append("count")
 
     
-    if "practice" in text or "problems" in text or "flashcards" in text:
+    if tag("intent", "practice") in tags:
         payload["question_type"] = "practice"
         payload["_inferred_fields"].append("question_type")
 
     
-    if "calculus" in text:
-        payload["subject"] = "calculus"
-        payload["_inferred_fields"].append("subject")
-    if "photosynthesis" in text or "photosynth" in text:
-        payload["topic"] = "photosynthesis"
-        payload["subject"] = "biology"
-        payload["_inferred_fields"].append("topic")
-        payload["_inferred_fields"].append("subject")
+    for name, (_, fields) in SUBJECT_RULES.items():
+        if tag("subject", name) in tags:
+            payload.update(fields)
+            payload["_inferred_fields"].extend(fields)
 
     
     payload["user_info"] = user_info or {}
@@ -80,18 +93,20 @@ def _llm_stub_generate(schema: Dict[str, Any], chat_history, latest_message, use
     return payload
 
 
-def _fallback_extract(schema: Dict[str, Any], chat_history, latest_message, user_info) -> Dict[str, Any]:
+def _fallback_extract(
+    schema: Dict[str, Any],
+    chat_history,
+    latest_message,
+    user_info,
+    conversation: Optional[ConversationText] = None,
+) -> Dict[str, Any]:
     """Fallback extractor; currently reuses LLM stub."""
-    return _llm_stub_generate(schema, chat_history, latest_message, user_info)
-
+    return _llm_stub_generate(schema, chat_history, latest_message, user_info, conversation)
 
-def _validate_with_pydantic(schema: Dict[str, Any], candidate: Dict[str, Any]) -> (Dict[str, Any], float):
-    required = schema.get("required", [])
-    props = schema.get("properties", {})
 
+def _build_validator(schema: CompiledSchema) -> Type[BaseModel]:
     fields = {}
-    for k, v in props.items():
-        t = v.get("type", "string")
+    for k, t in schema.property_types.items():
         if t == "integer":
             typ = (int, ...)
         elif t == "boolean":
@@ -101,18 +116,48 @@ def _validate_with_pydantic(schema: Dict[str, Any], candidate: Dict[str, Any]) -
         else:
             typ = (str, ...)
         fields[k] = typ
+    return create_model('TmpModel', **fields)
 
-    P = create_model('TmpModel', **fields)  
+
+def get_validator(schema: CompiledSchema) -> Type[BaseModel]:
+    """
+    Returns the pydantic model derived from a schema, built once per
+    schema fingerprint so a reloaded schema gets a new model.
+    """
+    cached = _validator_cache.get(schema.fingerprint)
+    if cached is not None:
+        _validator_stats["hits"] += 1
+        return cached
+
+    _validator_stats["misses"] += 1
+    cached = _validator_cache[schema.fingerprint] = _build_validator(schema)
+    return cached
+
+
+def validator_cache_stats() -> Dict[str, int]:
+    return {**_validator_stats, "size": len(_validator_cache)}
+
+
+def _validate_with_pydantic(
+    schema: CompiledSchema,
+    candidate: Dict[str, Any],
+    model: Optional[Type[BaseModel]] = None,
+) -> (Dict[str, Any], float):
+    required = schema.required
+    P = model or get_validator(schema)
 
     try:
-        validated = P(**{k: candidate.get(k) for k in props.keys()})
+        validated = P(**{k: candidate.get(k) for k in P.__fields__})
+        # Keep the candidate's shape: only coerced values, no model defaults
+        # (personalization supplies those later).
+        merged = {**candidate, **validated.dict(exclude_unset=True)}
         
         confidence = 0.95
         
         inferred = candidate.get("_inferred_fields", [])
         if inferred:
             confidence -= min(0.1, 0.02 * len(inferred))  
-        return validated.dict(), confidence
+        return merged, confidence
     except ValidationError:
         
         present = sum(1 for r in required if candidate.get(r) not in (None, "", []))
@@ -128,10 +173,8 @@ def _validate_with_pydantic(schema: Dict[str, Any], candidate: Dict[str, Any]) -
         return candidate, confidence
 
 
-def _apply_personalization(payload: Dict[str, Any], state) -> Dict[str, Any]:
+def _apply_personalization(payload: Dict[str, Any], profile: Optional[ProfileSnapshot]) -> Dict[str, Any]:
     try:
-        user_id = payload.get("user_info", {}).get("user_id")
-        profile = state.get_user(user_id) if state else None
         if not profile:
             return payload
 
@@ -171,14 +214,32 @@ async def generate_payload_for_tool(
     chat_history,
     latest_message,
     user_info,
-    state
+    state,
+    conversation: Optional[ConversationText] = None,
+    profile: Optional[ProfileSnapshot] = None,
+    deadline: Optional[Deadline] = None,
 ) -> (Dict[str, Any], float):
-    candidate = _llm_stub_generate(schema, chat_history, latest_message, user_info)
-    validated, conf = _validate_with_pydantic(schema, candidate)
+    """
+    Builds and validates the payload for one tool, then personalizes it from
+    `profile`. Without a request snapshot the profile is loaded from `state`.
+    Raises DeadlineExceeded once `deadline` has passed.
+    """
+    if deadline is not None:
+        deadline.check(f"extracting {tool_name} parameters")
+    if profile is None:
+        profile = await ProfileSnapshot.load(state, (user_info or {}).get("user_id"), deadline)
+
+    compiled = schema_registry.get(tool_name)
+    if compiled is None or (schema and schema is not compiled.raw):
+        compiled = CompiledSchema(tool_name, schema or {})
+
+    conversation = ConversationText.ensure(conversation, chat_history, latest_message)
+    candidate = _llm_stub_generate(schema, chat_history, latest_message, user_info, conversation)
+    validated, conf = _validate_with_pydantic(compiled, candidate)
 
     if conf >= 0.6:
-        return _apply_personalization(validated, state), conf
+        return _apply_personalization(validated, profile), conf
 
-    candidate2 = _fallback_extract(schema, chat_history, latest_message, user_info)
-    validated2, conf2 = _validate_with_pydantic(schema, candidate2)
-    return _apply_personalization(validated2, state), max(conf, conf2)
+    candidate2 = _fallback_extract(schema, chat_history, latest_message, user_info, conversation)
+    validated2, conf2 = _validate_with_pydantic(compiled, candidate2)
+    return _apply_personalization(validated2, profile), max(conf, conf2)
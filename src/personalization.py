@@ -81,6 +81,17 @@ def adjust_for_emotion(tool_name: str, payload: Dict, emotional_state: str) -> D
     return payload
 
 
+def personalize(tool_name: str, payload: Dict, profile) -> Dict:
+    """
+    Applies mastery, emotion and learning-style adjustments from a user profile
+    (a dict or ProfileSnapshot).
+    """
+    payload = adjust_for_mastery(tool_name, payload, profile.get("mastery_level", 1))
+    payload = adjust_for_emotion(tool_name, payload, profile.get("emotional_state", "neutral"))
+    payload = adjust_for_learning_style(tool_name, payload, profile.get("learning_style", "visual"))
+    return payload
+
+
 def adjust_for_learning_style(tool_name: str, payload: Dict, learning_style: str) -> Dict:
     """
     Adjust payload according to preferred learning style.
@@ -0,0 +1,68 @@
+import inspect
+from typing import Dict, Any, Optional
+
+from src.deadline import Deadline
+
+_MISSING = object()
+
+
+class ProfileSnapshot:
+    """
+    Request-scoped copy of a user's profile.
+    Loaded once per request, read by extraction and personalization, and
+    written back at the end only if something changed (as a delta merge).
+    """
+
+    def __init__(self, user_id: Optional[str], data: Optional[Dict[str, Any]] = None):
+        self.user_id = user_id
+        self.data: Dict[str, Any] = dict(data or {})
+        self._changes: Dict[str, Any] = {}
+
+    @classmethod
+    async def load(cls, state, user_id: Optional[str], deadline: Optional[Deadline] = None) -> "ProfileSnapshot":
+        """
+        Loads the profile from a sync or async state backend.
+        Raises DeadlineExceeded if an async load outlives `deadline`.
+        """
+        data = state.get_user(user_id) if state is not None and user_id else None
+        if inspect.isawaitable(data):
+            data = await (deadline.run(data, "loading the profile") if deadline is not None else data)
+        return cls(user_id, data)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._changes)
+
+    @property
+    def changes(self) -> Dict[str, Any]:
+        return dict(self._changes)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    def update(self, values: Dict[str, Any]):
+        for k, v in values.items():
+            if self.data.get(k, _MISSING) != v:
+                self.data[k] = v
+                self._changes[k] = v
+
+    async def save(self, state) -> bool:
+        """
+        Merges the changed fields into the backend. Returns False when there was nothing to write.
+        """
+        if not self._changes or not self.user_id:
+            return False
+        result = state.upsert_user({"user_id": self.user_id, **self._changes})
+        if inspect.isawaitable(result):
+            await result
+        self._changes = {}
+        return True
@@ -0,0 +1,92 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import random
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose full input/result is logged at INFO; DEBUG logs all of them.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+class Fields:
+    """
+    Log argument rendered as one JSON object, only when a handler formats it.
+    Pass snapshots (ids, counts, lists of names), not live request objects.
+    """
+    __slots__ = ("fields",)
+
+    def __init__(self, **fields: Any):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps(self.fields, default=str, separators=(",", ":"))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting tracebacks in the calling thread (the
+    stock QueueHandler does). Only the app's own `Fields` arguments, which are
+    snapshots, are rendered later in the listener thread; any other `%`-args
+    (third-party loggers included) are merged into the message right away,
+    before the objects they refer to can change.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if not args or (isinstance(args, tuple) and all(isinstance(a, Fields) for a in args)):
+            return record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL) -> QueueListener:
+    """
+    Routes the root logger through a queue so request handlers never block on
+    the log stream. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    queue = SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(queue, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(queue)]
+    root.setLevel(level)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def should_dump_payloads(logger: logging.Logger) -> bool:
+    """True when this request's full input/result should be logged."""
+    if logger.isEnabledFor(logging.DEBUG):
+        return True
+    return LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def history_stats(chat_history) -> Dict[str, int]:
+    return {
+        "history_messages": len(chat_history),
+        "history_chars": sum(len(m.get("content") or "") for m in chat_history),
+    }
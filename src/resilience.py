@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("TOOL_MAX_IN_FLIGHT", "16"))
+# Calls waiting for a slot beyond this are rejected; 0 means no limit.
+DEFAULT_MAX_QUEUED = int(os.getenv("TOOL_MAX_QUEUED", "64"))
+DEFAULT_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "10"))
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("TOOL_BREAKER_FAILURES", "5"))
+DEFAULT_RESET_TIMEOUT = float(os.getenv("TOOL_BREAKER_RESET_SECONDS", "30"))
+
+
+class AdapterUnavailableError(Exception):
+    """Raised without calling the adapter: its circuit is open or its queue is full."""
+
+
+class AdapterLimits:
+    """Per-adapter settings passed to ToolOrchestrator.register_adapter."""
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        timeout: Optional[float] = DEFAULT_CALL_TIMEOUT,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures.
+    open -> half_open once `reset_timeout` seconds have passed; one probe call
+    is let through and closes the circuit on success or reopens it on failure.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED or self.failure_threshold <= 0:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self):
+        """Called when an allowed call ended without an outcome (rejected or cancelled)."""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class AdapterGuard:
+    """
+    Wraps every call to one adapter: at most `max_in_flight` at a time (the
+    rest wait, up to `max_queued`), each bounded by `timeout` seconds including
+    the wait, and short-circuited while the breaker is open.
+    """
+
+    def __init__(self, limits: Optional[AdapterLimits] = None):
+        self.limits = limits or AdapterLimits()
+        self.breaker = CircuitBreaker(self.limits.failure_threshold, self.limits.reset_timeout)
+        self._slots = asyncio.Semaphore(self.limits.max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "short_circuited": 0}
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise AdapterUnavailableError("circuit open")
+        if self.limits.max_queued and self.queued - self._free_slots() >= self.limits.max_queued:
+            self.stats["rejected"] += 1
+            self.breaker.release_probe()
+            raise AdapterUnavailableError("too many queued calls")
+
+        self.stats["calls"] += 1
+        # Counted here rather than inside the slot coroutine, which wait_for may
+        # not start before later callers run the queue check above.
+        self.queued += 1
+        waiting = [True]
+
+        async def run_in_slot():
+            async with self._slots:
+                waiting[0] = False
+                self.queued -= 1
+                self.in_flight += 1
+                try:
+                    return await call()
+                finally:
+                    self.in_flight -= 1
+
+        try:
+            result = await asyncio.wait_for(run_in_slot(), self.limits.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            if waiting[0]:
+                self.queued -= 1
+        self.breaker.record_success()
+        return result
+
+    def _free_slots(self) -> int:
+        return self.limits.max_in_flight - self.in_flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            **self.stats,
+        }
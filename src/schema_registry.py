@@ -0,0 +1,114 @@
+import json
+import os
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from src.tool_registry import ToolRegistry, tool_registry
+
+SCHEMA_DIR = Path(__file__).parent / "schemas"
+
+# Seconds between mtime checks; 0 disables hot reloading.
+DEFAULT_RELOAD_INTERVAL = float(os.getenv("SCHEMA_RELOAD_INTERVAL", "5"))
+
+
+class CompiledSchema:
+    """
+    A parsed tool schema plus the lookups derived from it once:
+    required fields, property types and clarifying-question templates.
+    """
+    __slots__ = ("tool_name", "raw", "fingerprint", "required", "property_types", "questions", "mtime", "checked_at")
+
+    def __init__(self, tool_name: str, raw: Dict[str, Any], mtime: float = 0.0):
+        self.tool_name = tool_name
+        self.raw = raw
+        self.fingerprint = hashlib.sha1(json.dumps(raw, sort_keys=True).encode()).hexdigest()
+        self.required: List[str] = list(raw.get("required", []))
+        self.property_types: Dict[str, str] = {
+            k: v.get("type", "string") for k, v in raw.get("properties", {}).items()
+        }
+        label = tool_name.replace("_", " ")
+        self.questions: Dict[str, str] = {
+            r: f"Quick question: could you specify `{r}` for the {label}?" for r in self.required
+        }
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+
+    def missing_fields(self, payload: Dict[str, Any]) -> List[str]:
+        return [r for r in self.required if payload.get(r) in (None, "", [])]
+
+    def clarifying_question(self, payload: Dict[str, Any]) -> str:
+        for r in self.missing_fields(payload):
+            return self.questions[r]
+        return "Could you clarify your request?"
+
+
+class SchemaRegistry:
+    """
+    Loads each tool schema on first use and serves compiled lookups from memory.
+    Files are re-checked at most every `reload_interval` seconds and
+    re-parsed only when their mtime changes.
+    """
+
+    def __init__(self, schema_dir: Path = SCHEMA_DIR, files: Optional[Dict[str, str]] = None,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL, tools: Optional[ToolRegistry] = None):
+        self.schema_dir = Path(schema_dir)
+        # Fixed tool name -> schema file map; without one, each load reads the
+        # file declared in the tool registry, including tools registered later.
+        self._files = dict(files) if files else None
+        self.tools = tools or tool_registry
+        self.reload_interval = reload_interval
+        self._compiled: Dict[str, CompiledSchema] = {}
+
+    @property
+    def files(self) -> Dict[str, str]:
+        return self._files if self._files is not None else self.tools.schema_files()
+
+    def preload(self):
+        """Compiles every known schema up front (optional; get() loads on demand)."""
+        for tool_name in self.files:
+            self.get(tool_name)
+
+    def get(self, tool_name: str) -> Optional[CompiledSchema]:
+        """
+        Returns the compiled schema for a tool, or None if it has no valid schema.
+        """
+        compiled = self._compiled.get(tool_name)
+        if compiled is not None:
+            if not self.reload_interval or time.monotonic() - compiled.checked_at < self.reload_interval:
+                return compiled
+        return self._load(tool_name, compiled)
+
+    def _load(self, tool_name: str, current: Optional[CompiledSchema]) -> Optional[CompiledSchema]:
+        fname = self.files.get(tool_name)
+        if not fname:
+            print(f" No schema mapping found for tool: {tool_name}")
+            return None
+
+        p = self.schema_dir / fname
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            print(f" Schema file missing for {tool_name}: {p}")
+            self._compiled.pop(tool_name, None)
+            return None
+
+        if current is not None and current.mtime == mtime:
+            current.checked_at = time.monotonic()
+            return current
+
+        try:
+            compiled = CompiledSchema(tool_name, json.loads(p.read_text()), mtime)
+        except json.JSONDecodeError as e:
+            print(f" Failed to parse schema JSON for {tool_name}: {e}")
+            if current is not None:
+                # Keep serving the last good version until the file is fixed.
+                current.checked_at = time.monotonic()
+            return current
+
+        self._compiled[tool_name] = compiled
+        return compiled
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from src.conversation import ConversationText
+
+logger = logging.getLogger("ai_tutor_orchestrator.sessions")
+
+# Messages kept per session; older ones are dropped as new ones arrive.
+DEFAULT_SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "50"))
+DEFAULT_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+# Seconds of inactivity after which a session is closed.
+DEFAULT_SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+
+
+class Session:
+    """
+    One open conversation: a bounded message history plus the ConversationText
+    kept in step with it, so a turn only normalizes and scans the new messages.
+    `lock` serializes turns of the same session.
+    """
+    __slots__ = ("session_id", "user_info", "history", "conversation", "lock", "last_used")
+
+    def __init__(
+        self,
+        session_id: str,
+        user_info: Dict[str, Any],
+        chat_history: Optional[List[Dict[str, Optional[str]]]] = None,
+        max_messages: int = DEFAULT_SESSION_MAX_MESSAGES,
+    ):
+        self.session_id = session_id
+        self.user_info = dict(user_info)
+        self.history = deque(maxlen=max(1, max_messages))
+        self.conversation = ConversationText.from_messages([])
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        for m in chat_history or []:
+            self.add(m.get("role") or "user", m.get("content"))
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self.user_info.get("user_id")
+
+    def add(self, role: str, content: Optional[str]):
+        if len(self.history) == self.history.maxlen:
+            self.conversation.drop_first(1)
+        self.history.append({"role": role, "content": content})
+        self.conversation.append(content)
+
+
+class SessionStore:
+    """
+    Open sessions of this worker, LRU-bounded to `max_sessions` and closed after
+    `ttl` seconds without a turn. With a `state` backend that has
+    get_conversation/save_conversation, a session opened without a history
+    resumes the user's stored conversation, and closing or evicting a session
+    writes its history back.
+    """
+
+    def __init__(
+        self,
+        state=None,
+        max_messages: int = DEFAULT_SESSION_MAX_MESSAGES,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        ttl: float = DEFAULT_SESSION_TTL,
+    ):
+        self.state = state
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._pending = set()
+        self.stats = {"opened": 0, "evicted": 0, "expired": 0, "persist_errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def open(
+        self, user_info: Dict[str, Any], chat_history: Optional[List[Dict[str, Optional[str]]]] = None
+    ) -> Session:
+        user_id = user_info.get("user_id")
+        if chat_history is None and user_id and hasattr(self.state, "get_conversation"):
+            chat_history = await self.state.get_conversation(user_id)
+        session = Session(uuid.uuid4().hex, user_info, chat_history, self.max_messages)
+        self._sessions[session.session_id] = session
+        self.stats["opened"] += 1
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self.stats["evicted"] += 1
+            self._persist_later(evicted)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.last_used > self.ttl:
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+            self._persist_later(session)
+            return None
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        await self._persist(session)
+        return True
+
+    async def close_all(self):
+        """Persists every open session and waits for pending writes (shutdown)."""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        await asyncio.gather(*(self._persist(s) for s in sessions))
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def _persist_later(self, session: Session):
+        if self.state is None or not session.user_id:
+            return
+        task = asyncio.ensure_future(self._persist(session))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _persist(self, session: Session):
+        if not session.user_id or not hasattr(self.state, "save_conversation"):
+            return
+        try:
+            await self.state.save_conversation(session.user_id, list(session.history))
+        except Exception as e:
+            self.stats["persist_errors"] += 1
+            logger.error("Could not save conversation of session %s: %s", session.session_id, e)
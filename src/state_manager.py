@@ -1,21 +1,128 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
+import os
 import threading
+import time
 import re
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
 
+DEFAULT_NUM_SHARDS = int(os.getenv("STATE_SHARDS", "16"))
+# 0 disables the bound / expiry.
+DEFAULT_MAX_USERS = int(os.getenv("STATE_MAX_USERS", "100000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("STATE_TTL_SECONDS", "86400"))
+
+RECENT_TOOLS_LIMIT = 10
+CONVERSATION_LIMIT = 20
+
+
+class UserProfile:
+    """
+    Compact per-user record. Histories are fixed-size ring buffers of tuples
+    and timestamps are epoch seconds; to_dict() builds the public dict shape.
+    """
+    __slots__ = (
+        "user_id", "name", "grade_level", "learning_style", "emotional_state",
+        "mastery_level", "teaching_style", "last_interaction", "recent_tools", "conversation_history",
+    )
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.name = None
+        self.grade_level = None
+        self.learning_style = None
+        self.emotional_state = None
+        self.mastery_level = None
+        self.teaching_style = None
+        self.last_interaction = 0
+        # (tool, timestamp) and (role, content, timestamp)
+        self.recent_tools = deque(maxlen=RECENT_TOOLS_LIMIT)
+        self.conversation_history = deque(maxlen=CONVERSATION_LIMIT)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ts = datetime.utcfromtimestamp
+        return {
+            "user_id": self.user_id,
+            "name": self.name,
+            "grade_level": self.grade_level,
+            "learning_style": self.learning_style,
+            "emotional_state": self.emotional_state,
+            "mastery_level": self.mastery_level,
+            "teaching_style": self.teaching_style,
+            "last_interaction": ts(self.last_interaction),
+            "recent_tools": [{"tool": tool, "timestamp": ts(t)} for tool, t in self.recent_tools],
+            "conversation_history": [
+                {"role": role, "content": content, "timestamp": ts(t)}
+                for role, content, t in self.conversation_history
+            ],
+        }
+
+
+class _Shard:
+    __slots__ = ("lock", "users", "evictions", "expirations", "lock_wait")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Ordered by last_interaction: oldest first.
+        self.users: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self.lock_wait = 0.0
+
+
 class StateManager:
     """
     In-memory state store for demo purposes.
     Supports context tracking, personalization, and adaptive parameters.
+
+    Users are spread over shards by a hash of user_id, each with its own lock.
+    Every shard keeps its users ordered by last_interaction, so users idle for
+    longer than `ttl_seconds` and the least recently active users beyond
+    `max_users` are evicted from the front in O(1).
     """
     DEFAULT_EMOTIONAL_STATE = "Focused"
     DEFAULT_LEARNING_STYLE = "Direct"
     DEFAULT_MASTERY_LEVEL = 1
     DEFAULT_TEACHING_STYLE = "Direct"
 
-    def __init__(self):
-        self._lock = threading.Lock()
-        self._store: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, num_shards: int = DEFAULT_NUM_SHARDS, max_users: int = DEFAULT_MAX_USERS,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self._shards: List[_Shard] = [_Shard() for _ in range(max(1, num_shards))]
+        self._max_per_shard = -(-max_users // len(self._shards)) if max_users else 0
+        self._ttl = int(ttl_seconds) if ttl_seconds else None
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    @contextmanager
+    def _locked(self, shard: _Shard):
+        start = time.perf_counter()
+        shard.lock.acquire()
+        shard.lock_wait += time.perf_counter() - start
+        try:
+            yield shard.users
+        finally:
+            shard.lock.release()
+
+    def _touch(self, shard: _Shard, uid: str, user: UserProfile):
+        """Marks a user as just active and evicts expired / overflow users. Caller holds the lock."""
+        now = int(time.time())
+        user.last_interaction = now
+        users = shard.users
+        users[uid] = user
+        users.move_to_end(uid)
+
+        if self._ttl is not None:
+            while users:
+                oldest = next(iter(users.values()))
+                if now - oldest.last_interaction <= self._ttl:
+                    break
+                users.popitem(last=False)
+                shard.expirations += 1
+        if self._max_per_shard:
+            while len(users) > self._max_per_shard:
+                users.popitem(last=False)
+                shard.evictions += 1
 
     def upsert_user(self, user_info: Dict[str, Any]):
         if not user_info:
@@ -24,59 +131,86 @@ class StateManager:
         if not uid:
             return
 
-        with self._lock:
-            now = self._store.get(uid, {})
+        shard = self._shard(uid)
+        with self._locked(shard) as users:
+            user = users.get(uid) or UserProfile(uid)
             mastery_level = self._parse_mastery(user_info.get("mastery_level_summary") or user_info.get("mastery_level"))
-            now.update({
-                "user_id": uid,
-                "name": user_info.get("name"),
-                "grade_level": user_info.get("grade_level"),
-                "learning_style": user_info.get("learning_style_summary") or user_info.get("learning_style") or self.DEFAULT_LEARNING_STYLE,
-                "emotional_state": user_info.get("emotional_state_summary") or user_info.get("emotional_state") or self.DEFAULT_EMOTIONAL_STATE,
-                "mastery_level": mastery_level or self.DEFAULT_MASTERY_LEVEL,
-                "teaching_style": user_info.get("teaching_style") or self.DEFAULT_TEACHING_STYLE,
-                "last_interaction": datetime.utcnow(),
-                "recent_tools": now.get("recent_tools", []),
-                "conversation_history": now.get("conversation_history", [])
-            })
-            self._store[uid] = now
+            user.name = user_info.get("name")
+            user.grade_level = user_info.get("grade_level")
+            user.learning_style = user_info.get("learning_style_summary") or user_info.get("learning_style") or self.DEFAULT_LEARNING_STYLE
+            user.emotional_state = user_info.get("emotional_state_summary") or user_info.get("emotional_state") or self.DEFAULT_EMOTIONAL_STATE
+            user.mastery_level = mastery_level or self.DEFAULT_MASTERY_LEVEL
+            user.teaching_style = user_info.get("teaching_style") or self.DEFAULT_TEACHING_STYLE
+            self._touch(shard, uid, user)
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
-        return self._store.get(user_id)
+        shard = self._shard(user_id)
+        # Locked like the writers: to_dict() iterates the history deques, which
+        # raise if another thread appends to them mid-iteration.
+        with self._locked(shard) as users:
+            user = users.get(user_id)
+            if user is None:
+                return None
+            if self._ttl is not None and int(time.time()) - user.last_interaction > self._ttl:
+                del users[user_id]
+                shard.expirations += 1
+                return None
+            return user.to_dict()
 
     def update_emotional_state(self, user_id: str, state: str):
-        with self._lock:
-            user = self._store.get(user_id)
+        shard = self._shard(user_id)
+        with self._locked(shard) as users:
+            user = users.get(user_id)
             if user:
-                user["emotional_state"] = state
-                user["last_interaction"] = datetime.utcnow()
+                user.emotional_state = state
+                self._touch(shard, user_id, user)
 
     def update_mastery_level(self, user_id: str, level: int):
-        with self._lock:
-            user = self._store.get(user_id)
+        shard = self._shard(user_id)
+        with self._locked(shard) as users:
+            user = users.get(user_id)
             if user:
-                user["mastery_level"] = level
-                user["last_interaction"] = datetime.utcnow()
+                user.mastery_level = level
+                self._touch(shard, user_id, user)
 
     def add_tool_usage(self, user_id: str, tool_name: str):
-        with self._lock:
-            user = self._store.get(user_id)
+        shard = self._shard(user_id)
+        with self._locked(shard) as users:
+            user = users.get(user_id)
             if user:
-                tools = user.get("recent_tools", [])
-                tools.append({"tool": tool_name, "timestamp": datetime.utcnow()})
-                
-                user["recent_tools"] = tools[-10:]
-                user["last_interaction"] = datetime.utcnow()
+                user.recent_tools.append((tool_name, int(time.time())))
+                self._touch(shard, user_id, user)
 
     def add_conversation(self, user_id: str, role: str, content: str):
-        with self._lock:
-            user = self._store.get(user_id)
+        shard = self._shard(user_id)
+        with self._locked(shard) as users:
+            user = users.get(user_id)
             if user:
-                history = user.get("conversation_history", [])
-                history.append({"role": role, "content": content, "timestamp": datetime.utcnow()})
-               
-                user["conversation_history"] = history[-20:]
-                user["last_interaction"] = datetime.utcnow()
+                user.conversation_history.append((role, content, int(time.time())))
+                self._touch(shard, user_id, user)
+
+    def sweep(self) -> int:
+        """Evicts every expired user now. Returns how many were removed."""
+        if self._ttl is None:
+            return 0
+        removed = 0
+        cutoff = int(time.time()) - self._ttl
+        for shard in self._shards:
+            with self._locked(shard) as users:
+                while users and next(iter(users.values())).last_interaction < cutoff:
+                    users.popitem(last=False)
+                    shard.expirations += 1
+                    removed += 1
+        return removed
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "size": sum(len(s.users) for s in self._shards),
+            "shards": len(self._shards),
+            "evictions": sum(s.evictions for s in self._shards),
+            "expirations": sum(s.expirations for s in self._shards),
+            "lock_wait_seconds": sum(s.lock_wait for s in self._shards),
+        }
 
     def _parse_mastery(self, mastery_str) -> Optional[int]:
         if not mastery_str:
@@ -1,7 +1,64 @@
-from src.db import SessionLocal, User
+from src.db import SessionLocal, User, create_async_db_engine, init_db_async
 import datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import JSON, cast, func, select, text
 from sqlalchemy.exc import NoResultFound
 
+
+# json_patch would merge nested objects and drop null-valued keys, unlike jsonb ||.
+_SQLITE_SHALLOW_MERGE = text(
+    "(SELECT json_group_object(key, CASE type"
+    " WHEN 'object' THEN json(value) WHEN 'array' THEN json(value)"
+    " WHEN 'true' THEN json('true') WHEN 'false' THEN json('false') WHEN 'null' THEN json('null')"
+    " ELSE value END)"
+    " FROM (SELECT key, value, type FROM json_each(coalesce(users.user_info, '{}'))"
+    " WHERE key NOT IN (SELECT key FROM json_each(excluded.user_info))"
+    " UNION ALL SELECT key, value, type FROM json_each(excluded.user_info)))"
+)
+
+
+def merge_users_statement(dialect_name: str, user_infos: List[Dict[str, Any]]):
+    """
+    Builds a single INSERT ... ON CONFLICT (user_id) DO UPDATE that merges each
+    `user_info` into the stored JSON inside the database.
+    Returns None for dialects without native upsert support.
+
+    Both dialects merge top-level keys only and keep null values, like
+    {**stored, **user_info}: Postgres with jsonb ||, SQLite (a local stand-in)
+    by rebuilding the object from json_each of both sides.
+    """
+    now = datetime.datetime.utcnow()
+    values = [
+        dict(user_id=info.get("user_id"), user_info=info, conversation_history=[], last_interaction=now)
+        for info in user_infos
+    ]
+
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import JSONB, insert
+
+        stmt = insert(User).values(values)
+        current = func.coalesce(cast(User.user_info, JSONB), func.jsonb_build_object())
+        merged = cast(current.op("||")(cast(stmt.excluded.user_info, JSONB)), JSON)
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(User).values(values)
+        merged = _SQLITE_SHALLOW_MERGE
+    else:
+        return None
+
+    return stmt.on_conflict_do_update(
+        index_elements=[User.user_id],
+        set_={"user_info": merged, "last_interaction": now},
+    )
+
+
+def merge_user_statement(dialect_name: str, user_info: Dict[str, Any]):
+    """Single-user merge upsert that also returns the merged user_info."""
+    stmt = merge_users_statement(dialect_name, [user_info])
+    return stmt.returning(User.user_info) if stmt is not None else None
+
+
 class PostgresStateManager:
     def __init__(self):
         self.db = SessionLocal()
@@ -14,12 +71,125 @@ class PostgresStateManager:
             return None
 
     def upsert_user(self, user_info: dict):
+        """
+        Merges user_info into the stored profile and returns the merged profile.
+        """
+        stmt = merge_user_statement(self.db.bind.dialect.name, user_info)
+        if stmt is not None:
+            merged = self.db.execute(stmt).scalar_one()
+            self.db.commit()
+            return merged
+
         user_id = user_info.get("user_id")
         existing = self.db.query(User).filter(User.user_id == user_id).first()
         if existing:
-            existing.user_info = user_info
+            existing.user_info = {**(existing.user_info or {}), **user_info}
             existing.last_interaction = datetime.datetime.utcnow()
         else:
-            new_user = User(user_id=user_id, user_info=user_info, conversation_history=[])
-            self.db.add(new_user)
+            existing = User(user_id=user_id, user_info=user_info, conversation_history=[])
+            self.db.add(existing)
         self.db.commit()
+        return existing.user_info
+
+
+class AsyncPostgresStateManager:
+    """
+    Async state backend on a pooled SQLAlchemy async engine.
+    Every call runs in its own short-lived session, so concurrent requests
+    use separate pooled connections and never block the event loop.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, engine=None):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        self.engine = engine or create_async_db_engine(database_url)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def init_db(self):
+        await init_db_async(self.engine)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        async with self.sessions() as session:
+            result = await session.execute(select(User.user_info).where(User.user_id == user_id))
+            return result.scalar_one_or_none()
+
+    async def get_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Loads several profiles in one query. Unknown users are omitted."""
+        if not user_ids:
+            return {}
+        async with self.sessions() as session:
+            result = await session.execute(
+                select(User.user_id, User.user_info).where(User.user_id.in_(list(user_ids)))
+            )
+            return {uid: info for uid, info in result.all()}
+
+    async def upsert_user(self, user_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merges user_info into the stored profile in one round-trip
+        and returns the merged profile.
+        """
+        stmt = merge_user_statement(self.engine.dialect.name, user_info)
+        user_id = user_info.get("user_id")
+        async with self.sessions.begin() as session:
+            if stmt is not None:
+                return (await session.execute(stmt)).scalar_one()
+
+            result = await session.execute(select(User).where(User.user_id == user_id).with_for_update())
+            existing = result.scalar_one_or_none()
+            if existing:
+                existing.user_info = {**(existing.user_info or {}), **user_info}
+                existing.last_interaction = datetime.datetime.utcnow()
+            else:
+                existing = User(user_id=user_id, user_info=user_info, conversation_history=[])
+                session.add(existing)
+            return existing.user_info
+
+    async def upsert_many(self, user_infos: List[Dict[str, Any]]):
+        """
+        Merges several profiles in one transaction (one statement where supported).
+        Entries for the same user are combined first, later ones winning.
+        """
+        combined: Dict[str, Dict[str, Any]] = {}
+        for info in user_infos:
+            uid = info.get("user_id")
+            combined[uid] = {**combined.get(uid, {}), **info}
+        if not combined:
+            return
+
+        stmt = merge_users_statement(self.engine.dialect.name, list(combined.values()))
+        async with self.sessions.begin() as session:
+            if stmt is not None:
+                await session.execute(stmt)
+                return
+
+            result = await session.execute(
+                select(User).where(User.user_id.in_(list(combined))).with_for_update()
+            )
+            existing = {u.user_id: u for u in result.scalars()}
+            now = datetime.datetime.utcnow()
+            for uid, info in combined.items():
+                user = existing.get(uid)
+                if user:
+                    user.user_info = {**(user.user_info or {}), **info}
+                    user.last_interaction = now
+                else:
+                    session.add(User(user_id=uid, user_info=info, conversation_history=[]))
+
+    async def get_conversation(self, user_id: str) -> List[Dict[str, Any]]:
+        async with self.sessions() as session:
+            result = await session.execute(select(User.conversation_history).where(User.user_id == user_id))
+            return result.scalar_one_or_none() or []
+
+    async def save_conversation(self, user_id: str, history: List[Dict[str, Any]]):
+        """Replaces the stored conversation_history, creating the user row if needed."""
+        async with self.sessions.begin() as session:
+            result = await session.execute(select(User).where(User.user_id == user_id).with_for_update())
+            user = result.scalar_one_or_none()
+            if user:
+                user.conversation_history = list(history)
+                user.last_interaction = datetime.datetime.utcnow()
+            else:
+                session.add(User(user_id=user_id, user_info={"user_id": user_id}, conversation_history=list(history)))
@@ -0,0 +1,75 @@
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+# Off by default; set TOOL_CACHE_SIZE > 0 to cache responses of adapters with cache_responses.
+DEFAULT_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "0"))
+DEFAULT_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+
+
+def payload_key(tool_name: str, payload: Dict[str, Any], exclude: Iterable[str] = ()) -> str:
+    """
+    Canonical hash of a tool call. Keys are sorted, `exclude` fields and
+    internal `_`-prefixed fields are dropped, so equivalent payloads collide.
+    """
+    exclude = set(exclude)
+    relevant = {k: v for k, v in payload.items() if k not in exclude and not k.startswith("_")}
+    canonical = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{tool_name}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+class ToolResponseCache:
+    """
+    LRU cache of adapter responses keyed by payload_key.
+    Per tool, `ttl_per_tool` overrides the entry lifetime in seconds.
+    Which payload fields are left out of the key is up to each adapter
+    (BaseAdapter.volatile_fields); by default every field counts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        default_ttl: float = DEFAULT_CACHE_TTL,
+        ttl_per_tool: Optional[Dict[str, float]] = None,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_per_tool = dict(ttl_per_tool or {})
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key_for(self, tool_name: str, payload: Dict[str, Any], volatile_fields: Iterable[str] = ()) -> str:
+        return payload_key(tool_name, payload, volatile_fields)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, response = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        # Callers may mutate what they get back.
+        return copy.deepcopy(response)
+
+    def put(self, tool_name: str, key: str, response: Dict[str, Any]):
+        ttl = self.ttl_per_tool.get(tool_name, self.default_ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(response))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
@@ -1,92 +1,266 @@
-import json
-from typing import Dict, Any
-from pathlib import Path
-from src.adapters.mock_note_maker import MockNoteMaker
-from src.adapters.mock_flashcard import MockFlashcard
-from src.adapters.mock_concept_explainer import MockConceptExplainer
+import asyncio
+import copy
+import time
+from typing import Dict, Any, Optional
+from src.batching import DEFAULT_BATCH_SIZE, DEFAULT_BATCH_WAIT_MS, BatchingQueue
+from src.deadline import Deadline, DeadlineExceeded
+from src.hedging import HedgePolicy, LatencyHistogram, hedged
+from src.metrics import METRICS_ENABLED, record as record_stage
+from src.resilience import AdapterGuard, AdapterLimits, AdapterUnavailableError
+from src.schema_registry import CompiledSchema, SchemaRegistry, schema_registry
+from src.tool_registry import ToolRegistry, tool_registry
+from src.tool_cache import DEFAULT_CACHE_SIZE, ToolResponseCache, payload_key
 
-SCHEMA_DIR = Path(__file__).parent / "schemas"
+
+def timeout_marker(tool_name: str) -> Dict[str, Any]:
+    """Response recorded for a tool that could not finish within the request deadline."""
+    return {"error": f"Deadline exceeded before {tool_name} finished", "timed_out": True}
+
+
+class _SharedCall:
+    """An adapter call in flight and the callers sharing it."""
+    __slots__ = ("task", "followers", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.followers = 0
+        self.waiters = 0
 
 
 class ToolOrchestrator:
-    def __init__(self):
-        
-        self.adapters = {
-            "note_maker": MockNoteMaker(),
-            "flashcard_generator": MockFlashcard(),
-            "concept_explainer": MockConceptExplainer(),
-        }
-       
+    def __init__(
+        self,
+        schemas: Optional[SchemaRegistry] = None,
+        cache: Optional[ToolResponseCache] = None,
+        batch_size: Optional[int] = None,
+        batch_wait_ms: Optional[float] = None,
+        tools: Optional[ToolRegistry] = None,
+    ):
+        # Adapters are created from the tool registry on first use (see get_adapter).
+        self.tools = tools or tool_registry
+        self.adapters: Dict[str, Any] = {}
         self.last_payloads: Dict[str, Dict[str, Any]] = {}
+        # Schemas are compiled on first use, like adapters.
+        if schemas is None:
+            schemas = schema_registry if tools is None else SchemaRegistry(tools=tools)
+        self.schemas = schemas
+        # Identical payloads of adapters with cache_responses are answered from
+        # memory; off unless TOOL_CACHE_SIZE > 0 or a cache is passed in.
+        if cache is None and DEFAULT_CACHE_SIZE > 0:
+            cache = ToolResponseCache(max_entries=DEFAULT_CACHE_SIZE)
+        self.cache = cache
+        # payload key -> running adapter call, shared by identical concurrent calls.
+        self._inflight: Dict[str, _SharedCall] = {}
+        self.stats = {"coalesced": 0}
+        # Calls to adapters with supports_batch are grouped when batch_size > 1.
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.batch_wait_ms = DEFAULT_BATCH_WAIT_MS if batch_wait_ms is None else batch_wait_ms
+        self.batchers: Dict[str, BatchingQueue] = {}
+        # Concurrency cap, timeout and circuit breaker per tool.
+        self.guards: Dict[str, AdapterGuard] = {}
+        # Recent latencies per tool, and the tools that hedge slow calls.
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self.hedge_policies: Dict[str, HedgePolicy] = {}
+        self.hedge_stats: Dict[str, Dict[str, int]] = {}
 
-    def register_adapter(self, tool_name: str, adapter_instance):
+    def register_adapter(
+        self,
+        tool_name: str,
+        adapter_instance,
+        limits: Optional[AdapterLimits] = None,
+        hedge: Optional[HedgePolicy] = None,
+    ):
         """
         Dynamically add a new adapter at runtime.
+        `limits` overrides the default in-flight cap, timeout and breaker settings;
+        `hedge` enables hedged calls for this tool.
         """
         self.adapters[tool_name] = adapter_instance
+        self.batchers.pop(tool_name, None)
+        self.guards[tool_name] = AdapterGuard(limits)
+        self.latencies[tool_name] = LatencyHistogram()
+        self.hedge_stats.pop(tool_name, None)
+        if hedge is None:
+            self.hedge_policies.pop(tool_name, None)
+        else:
+            self.hedge_policies[tool_name] = hedge
 
-    def load_schema(self, tool_name: str) -> Dict[str, Any]:
+    def get_adapter(self, tool_name: str):
         """
-        Loads the JSON schema for a tool.
-        Returns {} if tool_name is invalid or file not found.
+        Returns the adapter for a tool, importing and registering it from the
+        tool registry on first use. None if the tool is unknown.
         """
-        mapping = {
-            "note_maker": "note_maker_schema.json",
-            "flashcard_generator": "flashcard_schema.json",
-            "concept_explainer": "concept_explainer_schema.json",
-        }
-        fname = mapping.get(tool_name)
-        if not fname:
-            print(f" No schema mapping found for tool: {tool_name}")
-            return {}
+        adapter = self.adapters.get(tool_name)
+        if adapter is None:
+            spec = self.tools.get(tool_name)
+            if spec is None:
+                return None
+            adapter = spec.load_adapter_class()()
+            self.register_adapter(tool_name, adapter, spec.limits, spec.hedge)
+        return adapter
 
-        p = SCHEMA_DIR / fname
-        if not p.exists():
-            print(f" Schema file missing for {tool_name}: {p}")
-            return {}
+    def adapter_states(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Breaker state, in-flight/queued calls, failure and hedge counters and
+        recent latency percentiles per adapter.
+        """
+        states = {}
+        for tool in self.adapters:
+            latencies = self._latency(tool)
+            states[tool] = {
+                **self._guard(tool).snapshot(),
+                **self._hedge_counters(tool),
+                "latency_p50": latencies.percentile(50),
+                "latency_p95": latencies.percentile(95),
+            }
+        return states
 
-        try:
-            return json.loads(p.read_text())
-        except json.JSONDecodeError as e:
-            print(f" Failed to parse schema JSON for {tool_name}: {e}")
-            return {}
+    def _hedge_counters(self, tool_name: str) -> Dict[str, int]:
+        return self.hedge_stats.setdefault(tool_name, {"hedges_fired": 0, "hedges_won": 0})
+
+    def _latency(self, tool_name: str) -> LatencyHistogram:
+        histogram = self.latencies.get(tool_name)
+        if histogram is None:
+            histogram = self.latencies[tool_name] = LatencyHistogram()
+        return histogram
+
+    def _guard(self, tool_name: str) -> AdapterGuard:
+        guard = self.guards.get(tool_name)
+        if guard is None:
+            guard = self.guards[tool_name] = AdapterGuard()
+        return guard
+
+    def get_schema(self, tool_name: str) -> Optional[CompiledSchema]:
+        """
+        Returns the compiled schema for a tool from the registry, or None.
+        """
+        return self.schemas.get(tool_name)
+
+    def load_schema(self, tool_name: str) -> Dict[str, Any]:
+        """
+        Returns the JSON schema for a tool.
+        Returns {} if tool_name is invalid or file not found.
+        """
+        compiled = self.schemas.get(tool_name)
+        return compiled.raw if compiled else {}
 
-    async def call_tool(self, tool_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    async def call_tool(self, tool_name: str, payload: Dict[str, Any], deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         Calls the tool adapter safely. Returns error dict if anything goes wrong.
+        Concurrent calls with the same payload key share one adapter call.
+        If `deadline` passes first, returns a timeout marker
+        {"error": ..., "timed_out": True} instead.
         """
-        adapter = self.adapters.get(tool_name)
+        try:
+            adapter = self.get_adapter(tool_name)
+        except Exception as e:
+            print(f"Adapter load failed for {tool_name}: {e}")
+            return {"error": f"Adapter load failed for {tool_name}: {str(e)}"}
         if not adapter:
             return {"error": f"No adapter found for tool {tool_name}"}
+        if deadline is not None and deadline.expired:
+            return timeout_marker(tool_name)
+
+        if not getattr(adapter, "cacheable", True):
+            task = asyncio.ensure_future(self._invoke(tool_name, adapter, payload, None))
+            return await self._await_call(tool_name, _SharedCall(task), deadline)
 
+        # Learner-dependent fields stay in the key unless the adapter declares them volatile.
+        key = payload_key(tool_name, payload, getattr(adapter, "volatile_fields", ()))
+        use_cache = self.cache is not None and getattr(adapter, "cache_responses", False)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.last_payloads[tool_name] = payload
+                return cached
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            shared.followers += 1
+            result = await self._await_call(tool_name, shared, deadline)
+            self.last_payloads[tool_name] = payload
+            return copy.deepcopy(result)
+
+        task = asyncio.ensure_future(self._invoke(tool_name, adapter, payload, key if use_cache else None))
+        shared = self._inflight[key] = _SharedCall(task)
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        result = await self._await_call(tool_name, shared, deadline)
+        # Followers copy the same dict, so hand ours out as a copy too.
+        return copy.deepcopy(result) if shared.followers else result
+
+    async def _await_call(self, tool_name: str, shared: "_SharedCall", deadline: Optional[Deadline]) -> Dict[str, Any]:
+        """
+        Waits for a (possibly shared) adapter call within this caller's deadline.
+        The call is cancelled only once no caller is waiting for it any more.
+        """
+        shared.waiters += 1
         try:
-            result = await adapter.call(payload)
+            if deadline is None:
+                return await asyncio.shield(shared.task)
+            return await deadline.run(asyncio.shield(shared.task), tool_name)
+        except DeadlineExceeded:
+            return timeout_marker(tool_name)
+        finally:
+            shared.waiters -= 1
+            if not shared.waiters and not shared.task.done():
+                shared.task.cancel()
+
+    async def _invoke(self, tool_name: str, adapter, payload: Dict[str, Any], cache_key: Optional[str]) -> Dict[str, Any]:
+        try:
+            guard = self._guard(tool_name)
+            policy = self.hedge_policies.get(tool_name)
+            result = await hedged(
+                lambda: guard.run(lambda: self._timed_send(tool_name, adapter, payload)),
+                policy.delay(self._latency(tool_name)) if policy else None,
+                self._hedge_counters(tool_name),
+            )
             if not isinstance(result, dict):
                 return {"error": f"Adapter returned invalid type for {tool_name}"}
             
             self.last_payloads[tool_name] = payload
+            if cache_key is not None and self.cache is not None and "error" not in result:
+                self.cache.put(tool_name, cache_key, result)
             return result
+        except asyncio.TimeoutError:
+            print(f"Adapter call timed out for {tool_name}")
+            return {"error": f"Adapter call timed out for {tool_name}"}
+        except AdapterUnavailableError as e:
+            return {"error": f"Adapter unavailable for {tool_name}: {e}"}
         except Exception as e:
             print(f"Adapter call failed for {tool_name}: {e}")
             return {"error": f"Adapter call failed for {tool_name}: {str(e)}"}
 
-    def make_clarifying_question(self, tool_name: str, payload: Dict[str, Any], schema: Dict[str, Any]) -> str:
+    async def _timed_send(self, tool_name: str, adapter, payload: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = await self._send(tool_name, adapter, payload)
+        elapsed = time.perf_counter() - start
+        self._latency(tool_name).record(elapsed)
+        if METRICS_ENABLED:
+            record_stage("adapter_call", tool_name, elapsed)
+        return result
+
+    async def _send(self, tool_name: str, adapter, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.batch_size <= 1 or not getattr(adapter, "supports_batch", False):
+            return await adapter.call(payload)
+        batcher = self.batchers.get(tool_name)
+        if batcher is None:
+            batcher = BatchingQueue(adapter, self.batch_size, self.batch_wait_ms / 1000)
+            self.batchers[tool_name] = batcher
+        return await batcher.submit(payload)
+
+    def make_clarifying_question(self, tool_name: str, payload: Dict[str, Any], schema: Dict[str, Any] = None) -> str:
         """
         Returns a concise question asking for the most critical missing required field.
         """
-        required = schema.get("required", [])
-        for r in required:
-            if payload.get(r) in (None, "", []):
-                return f"Quick question: could you specify `{r}` for the {tool_name.replace('_', ' ')}?"
-        return "Could you clarify your request?"
+        compiled = self.schemas.get(tool_name) or CompiledSchema(tool_name, schema or {})
+        return compiled.clarifying_question(payload)
 
     def check_missing_fields(self, tool_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Returns a dict of missing required fields.
         """
-        schema = self.load_schema(tool_name)
-        missing = {}
-        for r in schema.get("required", []):
-            if payload.get(r) in (None, "", []):
-                missing[r] = "required"
-        return missing
+        compiled = self.schemas.get(tool_name)
+        if not compiled:
+            return {}
+        return {r: "required" for r in compiled.missing_fields(payload)}
@@ -0,0 +1,151 @@
+import importlib
+import logging
+from importlib import metadata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger("ai_tutor_orchestrator.tools")
+
+# Third-party packages add tools by exposing a ToolSpec (or a zero-argument
+# callable returning one) under this entry point group, e.g. in pyproject.toml:
+#   [project.entry-points."ai_tutor_orchestrator.tools"]
+#   quiz_maker = "quiz_pkg.tools:QUIZ_MAKER"
+# The module named there should only declare the spec; the adapter module
+# itself is imported on first use.
+ENTRY_POINT_GROUP = "ai_tutor_orchestrator.tools"
+
+
+class ToolSpec:
+    """
+    Declaration of one tool:
+      - adapter: "package.module:ClassName", imported and instantiated on first use
+      - schema_file: JSON schema, relative to src/schemas or absolute
+      - keywords: context-analysis routing keywords
+      - agent_keywords: TutorAgent selection keywords (default: `keywords`)
+      - limits / hedge: AdapterLimits / HedgePolicy for ToolOrchestrator
+      - context_window: ContextWindow trimming the payload's chat_history
+        (default: the Orchestrator's policy)
+    """
+    __slots__ = ("name", "adapter", "schema_file", "keywords", "agent_keywords", "limits", "hedge", "context_window")
+
+    def __init__(
+        self,
+        name: str,
+        adapter: str,
+        schema_file: Optional[str] = None,
+        keywords: Iterable[str] = (),
+        agent_keywords: Optional[Iterable[str]] = None,
+        limits: Any = None,
+        hedge: Any = None,
+        context_window: Any = None,
+    ):
+        self.name = name
+        self.adapter = adapter
+        self.schema_file = schema_file
+        self.keywords = list(keywords)
+        self.agent_keywords = list(self.keywords if agent_keywords is None else agent_keywords)
+        self.limits = limits
+        self.hedge = hedge
+        self.context_window = context_window
+
+    def load_adapter_class(self):
+        module_name, _, class_name = self.adapter.partition(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+
+# Built-in tools, in TutorAgent selection order.
+BUILTIN_TOOLS = [
+    ToolSpec(
+        "flashcard_generator",
+        "src.adapters.mock_flashcard:MockFlashcard",
+        "flashcard_schema.json",
+        keywords=["flashcard", "flashcards", "flash card"],
+        agent_keywords=["flashcard"],
+    ),
+    ToolSpec(
+        "note_maker",
+        "src.adapters.mock_note_maker:MockNoteMaker",
+        "note_maker_schema.json",
+        keywords=["note", "notes", "summarize", "summarise", "summarize notes"],
+        agent_keywords=["note", "notes"],
+    ),
+    ToolSpec(
+        "concept_explainer",
+        "src.adapters.mock_concept_explainer:MockConceptExplainer",
+        "concept_explainer_schema.json",
+        keywords=["explanation", "explain simply", "what is", "understand", "explain"],
+        agent_keywords=["explain", "concept"],
+    ),
+]
+
+
+def _entry_points(group: str):
+    eps = metadata.entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group=group)
+    return eps.get(group, [])
+
+
+class ToolRegistry:
+    """
+    Tool name -> ToolSpec. Routing keywords and schema files are read from
+    here; adapters are only imported when a tool is first called.
+
+    Tables derived from the specs (see `cached`) are built on first use and
+    dropped whenever a tool is registered, so tools added at runtime or from
+    entry points are routed like built-in ones.
+    """
+
+    def __init__(self, specs: Iterable[ToolSpec] = BUILTIN_TOOLS, entry_point_group: Optional[str] = ENTRY_POINT_GROUP):
+        self.specs: Dict[str, ToolSpec] = {}
+        self._derived: Dict[str, Any] = {}
+        for spec in specs:
+            self.register(spec)
+        if entry_point_group:
+            self.load_entry_points(entry_point_group)
+
+    def register(self, spec: ToolSpec):
+        self.specs[spec.name] = spec
+        self._derived.clear()
+
+    def unregister(self, name: str):
+        if self.specs.pop(name, None) is not None:
+            self._derived.clear()
+
+    def cached(self, key: str, build: Callable[[], Any]) -> Any:
+        """Returns `build()`, computed once per set of registered tools. Treat it as read-only."""
+        value = self._derived.get(key)
+        if value is None:
+            value = self._derived[key] = build()
+        return value
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        for ep in _entry_points(group):
+            try:
+                spec: Union[ToolSpec, Callable[[], ToolSpec]] = ep.load()
+                self.register(spec if isinstance(spec, ToolSpec) else spec())
+            except Exception as e:
+                logger.error("Could not load tool entry point %s: %s", ep.name, e)
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self.specs.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def schema_files(self) -> Dict[str, str]:
+        return self.cached("schema_files", lambda: {
+            name: spec.schema_file for name, spec in self.specs.items() if spec.schema_file
+        })
+
+    def routing_keywords(self) -> Dict[str, List[str]]:
+        return self.cached("routing_keywords", lambda: {
+            name: spec.keywords for name, spec in self.specs.items() if spec.keywords
+        })
+
+    def agent_keywords(self) -> Dict[str, List[str]]:
+        return self.cached("agent_keywords", lambda: {
+            name: spec.agent_keywords for name, spec in self.specs.items() if spec.agent_keywords
+        })
+
+
+tool_registry = ToolRegistry()
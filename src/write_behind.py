@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger("ai_tutor_orchestrator.state")
+
+# Durability window: dirty profiles reach the database within this many seconds.
+DEFAULT_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "1.0"))
+DEFAULT_MAX_DIRTY = int(os.getenv("STATE_FLUSH_MAX_DIRTY", "100"))
+DEFAULT_MAX_CACHED = int(os.getenv("STATE_CACHE_MAX_PROFILES", "10000"))
+DEFAULT_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "300"))
+
+
+class WriteBehindStateManager:
+    """
+    Write-behind layer in front of an async state backend.
+
+    Hot profiles are kept in memory (LRU, refreshed after `cache_ttl` seconds).
+    upsert_user merges into the cached profile and records the change as a
+    pending delta; repeated updates to the same user collapse into one delta.
+    Deltas are written with the backend's `upsert_many` in one transaction
+    every `flush_interval` seconds, as soon as `max_dirty` users are pending,
+    and on close().
+
+    Each worker has its own cache, so a profile changed by another worker is
+    seen here only after this worker's cached copy expires.
+    """
+
+    def __init__(
+        self,
+        backend,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_dirty: int = DEFAULT_MAX_DIRTY,
+        max_cached: int = DEFAULT_MAX_CACHED,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+    ):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_cached = max_cached
+        self.cache_ttl = cache_ttl
+
+        self._profiles: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        # Deltas being written by the running flush; reads still overlay them until it commits.
+        self._flushing: Dict[str, Dict[str, Any]] = {}
+        self._flush_tasks = set()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"flushes": 0, "flushed_rows": 0, "coalesced": 0, "flush_errors": 0}
+
+    def __getattr__(self, name):
+        # Anything not handled here (init_db, ...) goes straight to the backend.
+        return getattr(self.backend, name)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        profile = await self._load(user_id)
+        return dict(profile) if profile else None
+
+    async def get_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Serves cached profiles from memory and loads the rest in one backend query."""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for uid in user_ids:
+            profile = self._fresh(uid)
+            if profile is None:
+                missing.append(uid)
+            elif profile:
+                found[uid] = dict(profile)
+
+        before = {uid: self._pending(uid) for uid in missing}
+        stored = await self.backend.get_users(missing) if missing else {}
+        for uid in missing:
+            profile = self._fresh(uid)
+            if profile is None:
+                profile = {**stored.get(uid, {}), **before[uid], **self._pending(uid)}
+                self._cache(uid, profile)
+            if profile:
+                found[uid] = dict(profile)
+        return found
+
+    async def upsert_many(self, user_infos: List[Dict[str, Any]]):
+        """Merges several profiles; they reach the database together in the next flush."""
+        for info in user_infos:
+            await self.upsert_user(info)
+
+    async def upsert_user(self, user_info: Dict[str, Any]) -> Dict[str, Any]:
+        self._ensure_flusher()
+        uid = user_info.get("user_id")
+        merged = {**(await self._load(uid)), **user_info}
+        self._cache(uid, merged)
+
+        pending = self._dirty.get(uid)
+        if pending is None:
+            self._dirty[uid] = dict(user_info)
+        else:
+            pending.update(user_info)
+            self.stats["coalesced"] += 1
+
+        if len(self._dirty) >= self.max_dirty:
+            task = asyncio.ensure_future(self._flush_logged())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        return dict(merged)
+
+    async def flush(self) -> int:
+        """
+        Writes every pending delta in one backend transaction.
+        Returns the number of users written.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            batch, self._dirty = self._dirty, {}
+            self._flushing = batch
+            try:
+                await self.backend.upsert_many(list(batch.values()))
+            except Exception:
+                # Put the batch back underneath anything that arrived meanwhile.
+                for uid, delta in batch.items():
+                    self._dirty[uid] = {**delta, **self._dirty.get(uid, {})}
+                self.stats["flush_errors"] += 1
+                raise
+            finally:
+                self._flushing = {}
+            self.stats["flushes"] += 1
+            self.stats["flushed_rows"] += len(batch)
+            return len(batch)
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("State flush failed on close, updates lost for users: %s", sorted(self._dirty))
+            raise
+        finally:
+            close = getattr(self.backend, "close", None)
+            if close:
+                await close()
+
+    async def _load(self, user_id: str) -> Dict[str, Any]:
+        entry = self._fresh(user_id)
+        if entry is not None:
+            return entry
+
+        before = self._pending(user_id)
+        stored = await self.backend.get_user(user_id) or {}
+        entry = self._fresh(user_id)
+        if entry is not None:
+            # Another coroutine cached a newer copy while we were waiting.
+            return entry
+        # Unflushed changes are newer than what the database has. The read may
+        # have raced a flush, so overlay what was pending when it started too.
+        profile = {**stored, **before, **self._pending(user_id)}
+        self._cache(user_id, profile)
+        return profile
+
+    def _pending(self, user_id: str) -> Dict[str, Any]:
+        """Changes not yet committed to the backend, oldest first."""
+        return {**self._flushing.get(user_id, {}), **self._dirty.get(user_id, {})}
+
+    def _fresh(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._profiles.get(user_id)
+        if entry is None or time.monotonic() - entry[1] >= self.cache_ttl:
+            return None
+        self._profiles.move_to_end(user_id)
+        return entry[0]
+
+    def _cache(self, user_id: str, profile: Dict[str, Any]):
+        self._profiles[user_id] = (profile, time.monotonic())
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_cached:
+            self._profiles.popitem(last=False)
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("State flush failed, will retry: %s", e)
@@ -0,0 +1,60 @@
+from src.context_analysis import analyze_context
+from src.conversation import ConversationText
+from src.keyword_matcher import KeywordMatcher
+
+
+def test_conversation_text_index():
+    history = [{"role": "user", "content": "Help me With Calculus"}, {"role": "assistant", "content": None}]
+    conv = ConversationText(history, "Make FLASHCARDS")
+
+    assert conv.text == "help me with calculus  make flashcards"
+    assert conv.messages == ["help me with calculus", "", "make flashcards"]
+    assert conv.tokens == ["help", "me", "with", "calculus", "make", "flashcards"]
+    assert conv.message_index(conv.text.index("flashcards")) == 2
+    assert conv.message_index(0) == 0
+
+
+def test_analyze_context_reuses_conversation():
+    history = [{"role": "user", "content": "I'm struggling with derivatives"}]
+    conv = ConversationText(history, "Can you summarize notes?")
+
+    result = analyze_context(history, "Can you summarize notes?", conv)
+    assert result == analyze_context(history, "Can you summarize notes?")
+    assert result["tools"] == ["concept_explainer", "note_maker"]
+
+
+def test_keyword_matcher_matches_substring_semantics():
+    table = {"a": ["hard", "harder"], "b": ["der", "understand"], "c": ["i don't understand"]}
+    matcher = KeywordMatcher(table)
+    text = "it is harder when i don't understand"
+
+    hits = {(h.start, h.keyword) for h in matcher.find_all(text)}
+    expected = {
+        (i, kw) for kws in table.values() for kw in kws
+        for i in range(len(text)) if text.startswith(kw, i)
+    }
+    assert hits == expected
+    assert matcher.tags(text) == {"a", "b", "c"}
+    assert matcher.tags("nothing here") == set()
+
+
+def test_incremental_analysis_matches_full_rescan():
+    from src.parameter_extraction import COUNT_PATTERN, COUNT_TAIL, TOPIC_PATTERN, TOPIC_TAIL
+
+    def analysis(conv):
+        return (
+            conv.text, conv.keyword_hits, conv.keyword_tags, conv.message_tags,
+            conv.search(TOPIC_PATTERN, TOPIC_TAIL), conv.search(COUNT_PATTERN, COUNT_TAIL),
+        )
+
+    # Matches that only appear, or grow, once the next message arrives.
+    contents = ["Tell me about", "photosynthesis", "and", "give me 5", "flashcards", "what", "is hard?", "", "ok"]
+    conv = ConversationText.from_messages([])
+    for i, content in enumerate(contents):
+        conv.append(content)
+        history = [{"content": c} for c in contents[:i]]
+        assert analysis(conv) == analysis(ConversationText(history, content))
+
+    conv.drop_first(2)
+    history = [{"content": c} for c in contents[2:-1]]
+    assert analysis(conv) == analysis(ConversationText(history, contents[-1]))
@@ -0,0 +1,52 @@
+import pytest
+
+from src.context_window import ContextWindow, ContextWindows
+from src.orchestrator import Orchestrator
+
+
+def _history(n, size=10):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:02d}" + "x" * (size - 2)}
+        for i in range(n)
+    ]
+
+
+def test_window_keeps_newest_messages_within_limits():
+    history = _history(10)
+    assert ContextWindow(max_messages=3, max_chars=0).apply(history) == history[-3:]
+    assert ContextWindow(max_messages=0, max_chars=25, keep_user_turns=0).apply(history) == history[-2:]
+    assert ContextWindow(max_messages=0, max_chars=0, max_tokens=6, keep_user_turns=0).apply(history) == history[-2:]
+    assert ContextWindow(max_messages=0, max_chars=0).apply(history) == history
+
+
+def test_window_always_keeps_recent_user_turns():
+    history = _history(6)
+    history[-1] = {"role": "assistant", "content": "y" * 500}
+    kept = ContextWindow(max_messages=10, max_chars=100, keep_user_turns=2).apply(history)
+    assert kept == [history[2], history[4]]
+
+
+def test_views_are_computed_once_per_policy():
+    windows = ContextWindows(_history(5))
+    short = ContextWindow(max_messages=2)
+    assert windows.view(short) is windows.view(ContextWindow(max_messages=2))
+    assert windows.view(None) is windows.chat_history
+
+
+@pytest.mark.asyncio
+async def test_payload_chat_history_is_trimmed_per_tool():
+    orchestrator = Orchestrator(context_window=ContextWindow(max_messages=2, max_chars=0))
+    orchestrator.tool_orch.tools.get("note_maker").context_window = ContextWindow(max_messages=1, max_chars=0)
+    try:
+        history = [{"role": "user", "content": "I want to learn photosynthesis"}] + _history(8)
+        result = await orchestrator.handle_chat(
+            {"user_id": "window_user", "grade_level": "10"}, history, "Make flashcards and notes"
+        )
+    finally:
+        orchestrator.tool_orch.tools.get("note_maker").context_window = None
+
+    payloads = result["payloads"]
+    assert payloads["flashcard_generator"]["payload"]["chat_history"] == history[-2:]
+    assert payloads["note_maker"]["payload"]["chat_history"] == history[-1:]
+    # Tool selection and extraction still see the whole conversation.
+    assert "photosynthesis" in payloads["flashcard_generator"]["payload"]["topic"]
@@ -1,4 +1,10 @@
-from src.state_postgres import PostgresStateManager
+import asyncio
+
+import pytest
+
+from src.state_postgres import PostgresStateManager, AsyncPostgresStateManager
+from src.profile_snapshot import ProfileSnapshot
+from src.write_behind import WriteBehindStateManager
 
 def test_upsert_get_user():
     state = PostgresStateManager()
@@ -6,3 +12,162 @@ def test_upsert_get_user():
     state.upsert_user(user_info)
     fetched = state.get_user("test123")
     assert fetched['name'] == "Test User"
+
+
+@pytest.mark.asyncio
+async def test_async_upsert_get_user(tmp_path):
+    state = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await state.init_db()
+    try:
+        assert await state.get_user("async123") is None
+
+        await asyncio.gather(*(
+            state.upsert_user({"user_id": f"async{i}", "name": f"User {i}"}) for i in range(5)
+        ))
+        await state.upsert_user({"user_id": "async1", "name": "Renamed"})
+
+        assert (await state.get_user("async1"))["name"] == "Renamed"
+        assert (await state.get_user("async4"))["name"] == "User 4"
+    finally:
+        await state.close()
+
+
+@pytest.mark.asyncio
+async def test_async_upsert_merges_in_one_statement(tmp_path):
+    state = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await state.init_db()
+    try:
+        merged = await state.upsert_user({"user_id": "merge1", "name": "Ana", "mastery_level": 2})
+        assert merged == {"user_id": "merge1", "name": "Ana", "mastery_level": 2}
+
+        merged = await state.upsert_user({"user_id": "merge1", "mastery_level": 5})
+        assert merged == {"user_id": "merge1", "name": "Ana", "mastery_level": 5}
+
+        await asyncio.gather(*(
+            state.upsert_user({"user_id": "merge1", f"field{i}": i}) for i in range(5)
+        ))
+        stored = await state.get_user("merge1")
+        assert all(stored[f"field{i}"] == i for i in range(5))
+        assert stored["name"] == "Ana"
+    finally:
+        await state.close()
+
+
+@pytest.mark.asyncio
+async def test_upsert_merge_is_shallow_and_keeps_nulls(tmp_path):
+    state = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await state.init_db()
+    try:
+        stored = {"user_id": "nested1", "prefs": {"style": "visual", "pace": "slow"}, "mood": "calm", "tags": [1]}
+        await state.upsert_user(stored)
+        update = {"user_id": "nested1", "prefs": {"style": "direct"}, "mood": None, "active": True}
+        expected = {**stored, **update}
+
+        assert await state.upsert_user(update) == expected
+        assert await state.get_user("nested1") == expected
+        await state.upsert_many([{"user_id": "nested1", "prefs": {"pace": "fast"}}])
+        assert (await state.get_user("nested1"))["prefs"] == {"pace": "fast"}
+    finally:
+        await state.close()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_coalesces_and_flushes(tmp_path):
+    backend = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await backend.init_db()
+    state = WriteBehindStateManager(backend, flush_interval=60, max_dirty=100)
+
+    await state.upsert_user({"user_id": "wb1", "name": "Ana"})
+    merged = await state.upsert_user({"user_id": "wb1", "mastery_level": 4})
+    assert merged == {"user_id": "wb1", "name": "Ana", "mastery_level": 4}
+    assert state.dirty_count == 1
+    assert state.stats["coalesced"] == 1
+    assert await backend.get_user("wb1") is None
+
+    assert await state.flush() == 1
+    assert (await backend.get_user("wb1"))["mastery_level"] == 4
+
+    await state.upsert_user({"user_id": "wb2", "name": "Ben"})
+    await state.close()
+    assert await WriteBehindStateManager(
+        AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    ).get_user("wb2") == {"user_id": "wb2", "name": "Ben"}
+
+
+class _SlowCommitBackend:
+    def __init__(self):
+        self.rows = {}
+        self.commit = asyncio.Event()
+
+    async def get_user(self, user_id):
+        return dict(self.rows[user_id]) if user_id in self.rows else None
+
+    async def get_users(self, user_ids):
+        return {uid: dict(self.rows[uid]) for uid in user_ids if uid in self.rows}
+
+    async def upsert_many(self, user_infos):
+        await self.commit.wait()
+        for info in user_infos:
+            self.rows[info["user_id"]] = {**self.rows.get(info["user_id"], {}), **info}
+
+
+@pytest.mark.asyncio
+async def test_write_behind_reads_see_in_flight_flush():
+    backend = _SlowCommitBackend()
+    state = WriteBehindStateManager(backend, flush_interval=60, max_dirty=1, cache_ttl=0)
+
+    await state.upsert_user({"user_id": "race1", "name": "Ana"})
+    await asyncio.sleep(0)
+    assert state.dirty_count == 0 and len(state._flush_tasks) == 1
+
+    # The flush is still writing: the database has nothing yet, and no delta is pending.
+    assert await state.get_user("race1") == {"user_id": "race1", "name": "Ana"}
+    assert await state.get_users(["race1"]) == {"race1": {"user_id": "race1", "name": "Ana"}}
+
+    backend.commit.set()
+    await state.close()
+    assert backend.rows["race1"] == {"user_id": "race1", "name": "Ana"}
+
+
+
+class _FailingBackend(_SlowCommitBackend):
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+
+    async def upsert_many(self, user_infos):
+        raise ConnectionError("database unavailable")
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_write_behind_close_releases_backend_when_flush_fails(caplog):
+    backend = _FailingBackend()
+    state = WriteBehindStateManager(backend, flush_interval=60, max_dirty=100)
+    await state.upsert_user({"user_id": "lost1", "name": "Ana"})
+
+    with pytest.raises(ConnectionError):
+        await state.close()
+    assert backend.closed
+    assert "lost1" in caplog.text
+
+@pytest.mark.asyncio
+async def test_profile_snapshot_writes_only_changes(tmp_path):
+    state = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await state.init_db()
+    try:
+        await state.upsert_user({"user_id": "snap1", "name": "Ana", "mastery_level": 2})
+
+        profile = await ProfileSnapshot.load(state, "snap1")
+        profile.update({"user_id": "snap1", "name": "Ana"})
+        assert not profile.changed
+        assert await profile.save(state) is False
+
+        profile.update({"mastery_level": 6})
+        assert profile.changes == {"mastery_level": 6}
+        assert await profile.save(state) is True
+        assert await state.get_user("snap1") == {"user_id": "snap1", "name": "Ana", "mastery_level": 6}
+    finally:
+        await state.close()
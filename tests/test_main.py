@@ -0,0 +1,30 @@
+import json
+
+import httpx
+import pytest
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import src.main as main
+
+TURN = {
+    "user_info": {"user_id": "timing1", "mastery_level": 2},
+    "chat_history": [],
+    "latest_message": "Make 5 flashcards about photosynthesis",
+}
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header_and_stream_event(monkeypatch):
+    monkeypatch.setattr(main, "SERVER_TIMING_ENABLED", True)
+    # The middleware is only installed at import when SERVER_TIMING_ENABLED=1.
+    app = BaseHTTPMiddleware(main.app, dispatch=main.add_server_timing)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/orchestrate", json=TURN)
+        assert "tool_selection;dur=" in response.headers["server-timing"]
+
+        response = await client.post("/orchestrate/stream", json=TURN)
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert "server-timing" not in response.headers
+        assert [e["event"] for e in events[-2:]] == ["summary", "server_timing"]
+        assert "tool_selection;dur=" in events[-1]["server_timing"]
+        assert "payload_generation.flashcard_generator;dur=" in events[-1]["server_timing"]
@@ -0,0 +1,36 @@
+from src.metrics import Histogram, StageMetrics, record, request_timings, server_timing_header, stage_metrics, timed
+
+
+def test_histogram_buckets_and_render():
+    metrics = StageMetrics(buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.05, 0.5):
+        metrics.observe("adapter_call", "note_maker", seconds)
+    metrics.observe("state_load", None, 0.001)
+
+    lines = metrics.render()
+    assert 'orchestrator_stage_seconds_bucket{stage="adapter_call",tool="note_maker",le="0.01"} 1' in lines
+    assert 'orchestrator_stage_seconds_bucket{stage="adapter_call",tool="note_maker",le="0.1"} 2' in lines
+    assert 'orchestrator_stage_seconds_bucket{stage="adapter_call",tool="note_maker",le="+Inf"} 3' in lines
+    assert 'orchestrator_stage_seconds_count{stage="state_load"} 1' in lines
+
+    h = Histogram((1.0,))
+    h.observe(1.0)
+    assert h.counts == [1, 0]
+
+
+def test_timed_feeds_request_timings():
+    timings = []
+    token = request_timings.set(timings)
+    try:
+        with timed("payload_generation", "flashcard_generator"):
+            pass
+        record("payload_generation", "flashcard_generator", 0.002)
+        record("state_write", None, 0.001)
+    finally:
+        request_timings.reset(token)
+    record("state_write", None, 0.001)
+
+    assert len(timings) == 3
+    assert stage_metrics.histograms[("state_write", "")].count >= 2
+    header = server_timing_header([("payload_generation", "flashcard_generator", 0.002)] * 2 + [("state_write", None, 0.001)])
+    assert header == "payload_generation.flashcard_generator;dur=4.00, state_write;dur=1.00"
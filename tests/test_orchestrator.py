@@ -1,4 +1,8 @@
+import asyncio
+import time
+
 import pytest
+from src.deadline import Deadline
 from src.orchestrator import Orchestrator
 
 @pytest.mark.asyncio
@@ -45,3 +49,134 @@ async def test_state_persistence():
 
     result2 = await orchestrator.handle_chat(user_info, chat_history, "Easy")
     assert result2["tool_responses"], "Tools should run without asking again"
+
+
+class _SlowAdapter:
+    def __init__(self, name, delay):
+        self.name = name
+        self.delay = delay
+
+    async def call(self, payload):
+        await asyncio.sleep(self.delay)
+        return {"tool": self.name}
+
+
+@pytest.mark.asyncio
+async def test_tools_run_concurrently_in_selected_order():
+    orchestrator = Orchestrator()
+    delays = {"flashcard_generator": 0.3, "note_maker": 0.2, "concept_explainer": 0.1}
+    for tool, delay in delays.items():
+        orchestrator.tool_orch.register_adapter(tool, _SlowAdapter(tool, delay))
+
+    user_info = {"user_id": "user456", "name": "Sam", "mastery_level": 2}
+    chat_history = [{"role": "user", "content": "Explain photosynthesis, then make notes and 5 flashcards"}]
+
+    start = time.perf_counter()
+    result = await orchestrator.handle_chat(user_info, chat_history, "Easy")
+    elapsed = time.perf_counter() - start
+
+    assert list(result["tool_responses"]) == result["selected_tools"]
+    assert elapsed < sum(delays.values())
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_emits_results_as_they_complete():
+    orchestrator = Orchestrator()
+    delays = {"flashcard_generator": 0.3, "note_maker": 0.2, "concept_explainer": 0.1}
+    for tool, delay in delays.items():
+        orchestrator.tool_orch.register_adapter(tool, _SlowAdapter(tool, delay))
+
+    user_info = {"user_id": "user789", "name": "Kai", "mastery_level": 2}
+    chat_history = [{"role": "user", "content": "Explain photosynthesis, then make notes and 5 flashcards"}]
+
+    events = [e async for e in orchestrator.stream_chat(user_info, chat_history, "Easy")]
+
+    assert events[0]["event"] == "analysis"
+    assert events[0]["selected_tools"] == ["flashcard_generator", "note_maker", "concept_explainer"]
+    results = [e["tool"] for e in events if e["event"] == "tool_result"]
+    assert results == ["concept_explainer", "note_maker", "flashcard_generator"]
+    assert events[-1]["event"] == "summary"
+    assert events[-1]["clarify_question"] is None
+
+
+@pytest.mark.asyncio
+async def test_profile_save_survives_early_stream_exit():
+    orchestrator = Orchestrator()
+    orchestrator.tool_orch.register_adapter("flashcard_generator", _SlowAdapter("flashcard_generator", 0.01))
+    saved = []
+
+    async def slow_save(profile):
+        await asyncio.sleep(0.15)
+        saved.append(profile.user_id)
+        return True
+
+    orchestrator._save_profile = slow_save
+    stream = orchestrator.stream_chat({"user_id": "user_early_exit"}, [], "Make 5 flashcards about photosynthesis")
+    async for event in stream:
+        if event["event"] == "tool_result":
+            break
+    await stream.aclose()
+    assert saved == []
+
+    await orchestrator.wait_for_saves()
+    assert saved == ["user_early_exit"]
+
+
+@pytest.mark.asyncio
+async def test_handle_batch_keeps_input_order():
+    orchestrator = Orchestrator()
+    turns = [
+        {"user_info": {"user_id": "batch1", "mastery_level": 2},
+         "chat_history": [{"role": "user", "content": "I want notes on photosynthesis"}], "latest_message": "Easy"},
+        {"user_info": {"user_id": "batch2", "mastery_level": 8},
+         "chat_history": [{"role": "user", "content": "Can you explain calculus?"}], "latest_message": "Please"},
+        {"user_info": {"user_id": "batch1", "emotional_state": "tired"},
+         "chat_history": [{"role": "user", "content": "Give me 5 flashcards on photosynthesis"}], "latest_message": "Easy"},
+    ]
+
+    results = await orchestrator.handle_batch(turns, max_concurrency=2)
+
+    assert [r["result"]["selected_tools"] for r in results] == [
+        ["note_maker"], ["concept_explainer"], ["flashcard_generator"],
+    ]
+    profile = await orchestrator.state.get_user("batch1")
+    assert profile["mastery_level"] == 2
+    assert profile["emotional_state"] == "tired"
+
+
+@pytest.mark.asyncio
+async def test_deadline_returns_partial_results_with_timeout_markers():
+    orchestrator = Orchestrator()
+    delays = {"flashcard_generator": 0.5, "note_maker": 0.01, "concept_explainer": 0.5}
+    for tool, delay in delays.items():
+        orchestrator.tool_orch.register_adapter(tool, _SlowAdapter(tool, delay))
+
+    user_info = {"user_id": "user_deadline", "name": "Ana", "mastery_level": 2}
+    chat_history = [{"role": "user", "content": "Explain photosynthesis, then make notes and 5 flashcards"}]
+
+    start = time.perf_counter()
+    result = await orchestrator.handle_chat(user_info, chat_history, "Easy", deadline=Deadline.after_ms(150))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.4
+    assert result["tool_responses"]["note_maker"] == {"tool": "note_maker"}
+    assert result["timed_out_tools"] == ["flashcard_generator", "concept_explainer"]
+    assert result["tool_responses"]["flashcard_generator"]["timed_out"] is True
+    assert list(result["tool_responses"]) == result["selected_tools"]
+
+    expired = Deadline.after_ms(1)
+    await asyncio.sleep(0.005)
+    result = await orchestrator.handle_chat(user_info, chat_history, "Easy", deadline=expired)
+    assert result["timed_out_tools"] == result["selected_tools"]
+    assert result["payloads"] == {}
+
+
+@pytest.mark.asyncio
+async def test_advanced_learner_gets_fifteen_flashcards():
+    orchestrator = Orchestrator()
+    user_info = {"user_id": "user_mastery8", "mastery_level": 8, "emotional_state": "neutral"}
+    result = await orchestrator.handle_chat(user_info, [], "Make flashcards about photosynthesis")
+
+    payload = result["payloads"]["flashcard_generator"]["payload"]
+    assert payload["count"] == 15
+    assert payload["difficulty"] == "hard"
@@ -0,0 +1,52 @@
+from src.parameter_extraction import (
+    _build_validator,
+    _llm_stub_generate,
+    _validate_with_pydantic,
+    get_validator,
+    validator_cache_stats,
+)
+from src.schema_registry import CompiledSchema, schema_registry
+
+
+def test_known_tools_validate_against_their_schema():
+    schema = schema_registry.get("flashcard_generator")
+    assert get_validator(schema) is get_validator(schema)
+
+    candidate = {"user_info": "u1", "topic": "cells", "count": "3", "difficulty": "easy",
+                 "include_examples": True, "subject": "biology"}
+    validated, confidence = _validate_with_pydantic(schema, candidate)
+    assert validated["count"] == 3
+    assert confidence == 0.95
+
+
+def test_extracted_payload_confidence_is_unchanged_by_caching():
+    # The schema types user_info as a string, so real payloads take the
+    # heuristic-confidence branch, with or without a cached model.
+    schema = schema_registry.get("flashcard_generator")
+    history = [{"role": "user", "content": None}, {"role": "assistant", "content": "Sure"}]
+    candidate = _llm_stub_generate({}, history, "Make flashcards about photosynthesis", {"user_id": "u1"})
+
+    validated, confidence = _validate_with_pydantic(schema, candidate)
+    uncached, uncached_confidence = _validate_with_pydantic(schema, candidate, _build_validator(schema))
+    assert validated is candidate and uncached is candidate
+    assert confidence == uncached_confidence == 0.6
+
+
+def test_validation_keeps_candidate_shape_without_model_defaults():
+    schema = schema_registry.get("flashcard_generator")
+    candidate = {"topic": "cells", "subject": "biology", "_inferred_fields": ["topic"], "extra": 1}
+    validated, _ = _validate_with_pydantic(schema, candidate)
+    assert validated == candidate
+
+
+def test_schema_models_are_built_once():
+    schema = CompiledSchema("custom_tool", {"required": ["topic"], "properties": {"topic": {"type": "string"}}})
+    before = validator_cache_stats()
+
+    first = get_validator(schema)
+    second = get_validator(CompiledSchema("custom_tool", dict(schema.raw)))
+
+    after = validator_cache_stats()
+    assert first is second
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
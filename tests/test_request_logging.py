@@ -0,0 +1,51 @@
+import logging
+from queue import SimpleQueue
+
+from src.request_logging import DeferredQueueHandler, Fields, history_stats
+
+
+class _Exploding:
+    def __str__(self):
+        raise AssertionError("formatted although the level is disabled")
+
+
+def test_fields_are_formatted_only_when_emitted():
+    logger = logging.getLogger("test_request_logging.lazy")
+    logger.setLevel(logging.WARNING)
+    logger.info("%s", Fields(event="orchestrate", payload=_Exploding()))
+
+    assert str(Fields(event="orchestrate", tools=["note_maker"], n=2)) == '{"event":"orchestrate","tools":["note_maker"],"n":2}'
+    assert history_stats([{"role": "user", "content": "abc"}, {"role": "assistant", "content": None}]) == {
+        "history_messages": 2, "history_chars": 3,
+    }
+
+
+def test_deferred_queue_handler_leaves_formatting_to_the_listener():
+    queue = SimpleQueue()
+    logger = logging.getLogger("test_request_logging.queue")
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(queue))
+    fields = Fields(event="orchestrate")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.error("%s", fields, exc_info=True)
+
+    record = queue.get_nowait()
+    assert record.args == (fields,)
+    assert record.exc_info is not None
+    assert '"event":"orchestrate"' in logging.Formatter().format(record)
+
+
+def test_deferred_queue_handler_formats_other_args_immediately():
+    queue = SimpleQueue()
+    logger = logging.getLogger("test_request_logging.eager")
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(queue))
+    tools = ["note_maker"]
+    logger.warning("tools: %s", tools)
+    tools.append("flashcard_generator")
+
+    record = queue.get_nowait()
+    assert record.args is None
+    assert record.getMessage() == "tools: ['note_maker']"
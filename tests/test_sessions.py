@@ -0,0 +1,87 @@
+import pytest
+
+from src.conversation import ConversationText
+from src.orchestrator import Orchestrator
+from src.sessions import Session, SessionStore
+from src.state_postgres import AsyncPostgresStateManager
+
+
+def _snapshot(conversation):
+    return (
+        conversation.messages, conversation.offsets, conversation.text,
+        conversation.latest_message, conversation.keyword_tags, conversation.message_tags,
+    )
+
+
+def test_incremental_conversation_matches_full_rebuild():
+    contents = ["I want to learn photosynthesis", "Sure! Notes or flashcards?", "Explain it simply", "Make flashcards"]
+    conversation = ConversationText.from_messages([])
+    for content in contents:
+        conversation.keyword_tags  # computed, then invalidated by the append
+        conversation.append(content)
+    history = [{"content": c} for c in contents[:-1]]
+    assert _snapshot(conversation) == _snapshot(ConversationText(history, contents[-1]))
+
+    conversation.drop_first(2)
+    assert _snapshot(conversation) == _snapshot(ConversationText(history[2:], contents[-1]))
+
+
+def test_session_history_is_bounded():
+    session = Session("s1", {"user_id": "u1"}, max_messages=3)
+    for i in range(5):
+        session.add("user", f"message {i}")
+    assert [m["content"] for m in session.history] == ["message 2", "message 3", "message 4"]
+    assert session.conversation.messages == ["message 2", "message 3", "message 4"]
+
+
+@pytest.mark.asyncio
+async def test_session_turn_matches_full_request():
+    orchestrator = Orchestrator()
+    user_info = {"user_id": "session_user", "grade_level": "10", "emotional_state": "focused"}
+    session = await SessionStore().open(user_info, [{"role": "user", "content": "I want to learn photosynthesis"}])
+
+    result = await orchestrator.handle_session_turn(
+        session, "Can you give me 5 flashcards?",
+        new_messages=[{"role": "assistant", "content": "Sure! Do you want notes or flashcards?"}],
+    )
+    expected = await orchestrator.handle_chat(
+        user_info,
+        [
+            {"role": "user", "content": "I want to learn photosynthesis"},
+            {"role": "assistant", "content": "Sure! Do you want notes or flashcards?"},
+        ],
+        "Can you give me 5 flashcards?",
+    )
+    assert result["selected_tools"] == expected["selected_tools"]
+    assert "flashcard_generator" in result["selected_tools"]
+    assert result["payloads"]["flashcard_generator"] == expected["payloads"]["flashcard_generator"]
+    assert len(session.history) == 3
+
+
+@pytest.mark.asyncio
+async def test_closed_session_resumes_from_state(tmp_path):
+    state = AsyncPostgresStateManager(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+    await state.init_db()
+    try:
+        store = SessionStore(state, max_messages=2)
+        session = await store.open({"user_id": "resume1"}, [])
+        session.add("user", "first")
+        session.add("assistant", "second")
+        session.add("user", "third")
+        assert await store.close(session.session_id)
+        assert store.get(session.session_id) is None
+
+        resumed = await store.open({"user_id": "resume1"})
+        assert [m["content"] for m in resumed.history] == ["second", "third"]
+        assert resumed.conversation.messages == ["second", "third"]
+    finally:
+        await state.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_session_expires():
+    store = SessionStore(ttl=0)
+    session = await store.open({"user_id": "idle1"}, [])
+    session.last_used -= 1
+    assert store.get(session.session_id) is None
+    assert store.stats["expired"] == 1
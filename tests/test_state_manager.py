@@ -0,0 +1,41 @@
+from src.state_manager import StateManager
+
+
+def test_upsert_and_update_user():
+    state = StateManager()
+    state.upsert_user({"user_id": "s1", "name": "Ana", "mastery_level": "Level 4"})
+    state.update_emotional_state("s1", "tired")
+    state.add_tool_usage("s1", "note_maker")
+
+    user = state.get_user("s1")
+    assert user["mastery_level"] == 4
+    assert user["emotional_state"] == "tired"
+    assert [t["tool"] for t in user["recent_tools"]] == ["note_maker"]
+    assert state.get_user("missing") is None
+
+
+def test_least_recently_active_users_are_evicted():
+    state = StateManager(num_shards=1, max_users=3, ttl_seconds=0)
+    for i in range(5):
+        state.upsert_user({"user_id": f"u{i}"})
+    state.update_mastery_level("u2", 5)
+    state.upsert_user({"user_id": "u5"})
+
+    assert state.get_user("u0") is None
+    assert state.get_user("u3") is None
+    assert state.get_user("u2") is not None
+    metrics = state.metrics()
+    assert metrics["size"] == 3
+    assert metrics["evictions"] == 3
+
+
+def test_idle_users_expire():
+    state = StateManager(num_shards=4, max_users=0, ttl_seconds=60)
+    state.upsert_user({"user_id": "idle"})
+    state.upsert_user({"user_id": "active"})
+    state._shard("idle").users["idle"].last_interaction -= 300
+
+    assert state.get_user("idle") is None
+    assert state.get_user("active") is not None
+    assert state.metrics()["expirations"] == 1
+    assert state.sweep() == 0
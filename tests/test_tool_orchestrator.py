@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from src.adapters.base_adapter import BaseAdapter
+from src.adapters.mock_flashcard import MockFlashcard
+from src.hedging import HedgePolicy, LatencyHistogram
+from src.resilience import AdapterLimits
+from src.schema_registry import SchemaRegistry
+from src.tool_cache import ToolResponseCache
+from src.tool_orchestrator import ToolOrchestrator
+from src.tool_registry import ToolRegistry, ToolSpec
+
+
+def test_schema_lookups_share_registry():
+    orch = ToolOrchestrator()
+    schema = orch.load_schema("flashcard_generator")
+    assert "topic" in schema["required"]
+    assert orch.load_schema("flashcard_generator") is schema
+
+    payload = {"user_info": {"user_id": "u1"}, "topic": "cells", "count": 5, "difficulty": "easy"}
+    assert orch.check_missing_fields("flashcard_generator", payload) == {"subject": "required"}
+    question = orch.make_clarifying_question("flashcard_generator", payload, schema)
+    assert "`subject`" in question
+    assert orch.load_schema("unknown_tool") == {}
+
+
+def test_schema_registry_reloads_on_mtime_change(tmp_path):
+    path = tmp_path / "demo_schema.json"
+    path.write_text(json.dumps({"required": ["topic"], "properties": {"topic": {"type": "string"}}}))
+    registry = SchemaRegistry(schema_dir=tmp_path, files={"demo": "demo_schema.json"}, reload_interval=0.001)
+
+    first = registry.get("demo")
+    assert first.required == ["topic"]
+    assert registry.get("demo") is first
+
+    path.write_text(json.dumps({"required": ["topic", "count"], "properties": {"count": {"type": "integer"}}}))
+    os.utime(path, (first.mtime + 10, first.mtime + 10))
+    time.sleep(0.01)
+    second = registry.get("demo")
+    assert second.required == ["topic", "count"]
+    assert second.property_types == {"count": "integer"}
+
+
+class _CountingAdapter:
+    cache_responses = True
+    volatile_fields = ("user_info", "chat_history")
+
+    def __init__(self, cacheable=True):
+        self.calls = 0
+        self.cacheable = cacheable
+
+    async def call(self, payload):
+        self.calls += 1
+        return {"topic": payload["topic"], "n": self.calls}
+
+
+@pytest.mark.asyncio
+async def test_tool_cache_hits_ignore_volatile_fields():
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=2))
+    adapter = _CountingAdapter()
+    orch.register_adapter("demo", adapter)
+
+    first = await orch.call_tool("demo", {"topic": "cells", "user_info": {"user_id": "a"}})
+    first["n"] = 99
+    again = await orch.call_tool("demo", {"user_info": {"user_id": "b"}, "topic": "cells", "chat_history": []})
+    assert adapter.calls == 1
+    assert again == {"topic": "cells", "n": 1}
+
+    await orch.call_tool("demo", {"topic": "atoms"})
+    await orch.call_tool("demo", {"topic": "waves"})
+    assert adapter.calls == 3
+    assert orch.cache.stats == {"hits": 1, "misses": 3, "evictions": 1, "expired": 0}
+
+    await orch.call_tool("demo", {"topic": "cells"})
+    assert adapter.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_tool_cache_ttl_and_opt_out():
+    orch = ToolOrchestrator(cache=ToolResponseCache(ttl_per_tool={"demo": 0.001}))
+    adapter = _CountingAdapter()
+    orch.register_adapter("demo", adapter)
+    await orch.call_tool("demo", {"topic": "cells"})
+    time.sleep(0.01)
+    await orch.call_tool("demo", {"topic": "cells"})
+    assert adapter.calls == 2
+    assert orch.cache.stats["expired"] == 1
+
+    fresh = _CountingAdapter(cacheable=False)
+    orch.register_adapter("fresh", fresh)
+    await orch.call_tool("fresh", {"topic": "cells"})
+    await orch.call_tool("fresh", {"topic": "cells"})
+    assert fresh.calls == 2
+    assert len(orch.cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_tool_cache_keeps_learner_fields_unless_adapter_opts_out():
+    assert ToolOrchestrator().cache is None
+
+    orch = ToolOrchestrator(cache=ToolResponseCache())
+    echo = BaseAdapter(latency=0)
+    orch.register_adapter("echo", echo)
+    await orch.call_tool("echo", {"topic": "cells", "user_info": {"user_id": "a"}})
+    second = await orch.call_tool("echo", {"topic": "cells", "user_info": {"user_id": "b"}})
+    assert second["echo"]["user_info"] == {"user_id": "b"}
+    assert len(orch.cache) == 0
+
+
+class _SlowCountingAdapter(_CountingAdapter):
+    async def call(self, payload):
+        await asyncio.sleep(0.02)
+        return await super().call(payload)
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_share_one_adapter_call():
+    orch = ToolOrchestrator()
+    adapter = _SlowCountingAdapter()
+    orch.register_adapter("demo", adapter)
+
+    payloads = [{"topic": "cells", "user_info": {"user_id": f"u{i}"}} for i in range(10)]
+    results = await asyncio.gather(*(orch.call_tool("demo", p) for p in payloads))
+    assert adapter.calls == 1
+    assert orch.stats["coalesced"] == 9
+    assert all(r == {"topic": "cells", "n": 1} for r in results)
+    results[0]["n"] = 99
+    assert results[1]["n"] == 1
+    assert orch._inflight == {}
+
+    other = _SlowCountingAdapter(cacheable=False)
+    orch.register_adapter("fresh", other)
+    await asyncio.gather(*(orch.call_tool("fresh", {"topic": "cells"}) for _ in range(3)))
+    assert other.calls == 3
+
+    echo = BaseAdapter(latency=0.02)
+    orch.register_adapter("echo", echo)
+    results = await asyncio.gather(*(
+        orch.call_tool("echo", {"topic": "cells", "user_info": {"user_id": f"u{i}"}}) for i in range(3)
+    ))
+    assert [r["echo"]["user_info"]["user_id"] for r in results] == ["u0", "u1", "u2"]
+    assert orch.stats["coalesced"] == 9
+
+
+class _BatchAdapter:
+    supports_batch = True
+
+    def __init__(self):
+        self.batches = []
+
+    async def call_batch(self, payloads):
+        self.batches.append(len(payloads))
+        await asyncio.sleep(0.01)
+        return [ValueError("bad topic") if p["topic"] == "bad" else {"topic": p["topic"]} for p in payloads]
+
+
+@pytest.mark.asyncio
+async def test_batching_queue_groups_calls_and_routes_results():
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0), batch_size=4, batch_wait_ms=5)
+    adapter = _BatchAdapter()
+    orch.register_adapter("demo", adapter)
+
+    topics = [f"t{i}" for i in range(9)] + ["bad"]
+    results = await asyncio.gather(*(orch.call_tool("demo", {"topic": t}) for t in topics))
+    assert adapter.batches == [4, 4, 2]
+    assert [r.get("topic") for r in results[:9]] == topics[:9]
+    assert "bad topic" in results[9]["error"]
+    assert orch.batchers["demo"].stats == {"batches": 3, "items": 10}
+
+
+@pytest.mark.asyncio
+async def test_mock_adapters_batch_matches_single_calls():
+    orch = ToolOrchestrator()
+    payloads = [{"topic": "cells", "count": 2}, {"topic": "atoms"}, {}]
+    for tool in ("flashcard_generator", "note_maker", "concept_explainer"):
+        adapter = orch.get_adapter(tool)
+        singles = [await adapter.call(dict(p)) for p in payloads]
+        assert await adapter.call_batch([dict(p) for p in payloads]) == singles
+
+
+class _FlakyAdapter:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.fail = False
+
+    async def call(self, payload):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("backend down")
+            return {"topic": payload["topic"]}
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_adapter_limits_cap_in_flight_and_time_out():
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0))
+    adapter = _FlakyAdapter(delay=0.02)
+    orch.register_adapter("demo", adapter, AdapterLimits(max_in_flight=2, max_queued=3, timeout=1))
+
+    results = await asyncio.gather(*(orch.call_tool("demo", {"topic": f"t{i}"}) for i in range(8)))
+    assert adapter.peak == 2
+    assert sum("error" in r for r in results) == 3
+    assert orch.adapter_states()["demo"]["rejected"] == 3
+
+    orch.register_adapter("slow", _FlakyAdapter(delay=0.2), AdapterLimits(timeout=0.01))
+    result = await orch.call_tool("slow", {"topic": "cells"})
+    assert "timed out" in result["error"]
+    assert orch.adapter_states()["slow"]["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_and_recovers():
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0))
+    adapter = _FlakyAdapter()
+    adapter.fail = True
+    orch.register_adapter("demo", adapter, AdapterLimits(failure_threshold=2, reset_timeout=0.05))
+
+    for i in range(2):
+        assert "backend down" in (await orch.call_tool("demo", {"topic": f"t{i}"}))["error"]
+    assert orch.adapter_states()["demo"]["state"] == "open"
+    assert "circuit open" in (await orch.call_tool("demo", {"topic": "t3"}))["error"]
+    assert orch.adapter_states()["demo"]["short_circuited"] == 1
+
+    await asyncio.sleep(0.06)
+    adapter.fail = False
+    assert await orch.call_tool("demo", {"topic": "t4"}) == {"topic": "t4"}
+    assert orch.adapter_states()["demo"]["state"] == "closed"
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(window=100)
+    assert histogram.percentile(95) is None
+    for ms in range(1, 201):
+        histogram.record(ms / 1000)
+    assert len(histogram) == 100
+    assert histogram.percentile(50) == 0.15
+    assert histogram.percentile(95) == 0.195
+    assert HedgePolicy(percentile=95, min_samples=200).delay(histogram) is None
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_wins_over_slow_first_attempt():
+    orch = ToolOrchestrator(cache=ToolResponseCache(max_entries=0))
+    delays = iter([0.01] * 5 + [0.5, 0.01])
+    adapter = MockFlashcard(latency=lambda: next(delays))
+    orch.register_adapter("flashcard_generator", adapter, hedge=HedgePolicy(percentile=90, min_samples=5))
+
+    for i in range(5):
+        await orch.call_tool("flashcard_generator", {"topic": f"warmup {i}"})
+    assert orch.adapter_states()["flashcard_generator"]["hedges_fired"] == 0
+
+    start = time.perf_counter()
+    result = await orch.call_tool("flashcard_generator", {"topic": "cells", "count": 2})
+    assert time.perf_counter() - start < 0.2
+    assert result["count"] == 2
+    state = orch.adapter_states()["flashcard_generator"]
+    assert (state["hedges_fired"], state["hedges_won"]) == (1, 1)
+    await asyncio.sleep(0.01)
+    assert orch.adapter_states()["flashcard_generator"]["in_flight"] == 0
+
+
+def test_adapters_are_created_from_registry_on_first_use():
+    limits = AdapterLimits(max_in_flight=1)
+    registry = ToolRegistry(
+        [ToolSpec("quiz_maker", "src.adapters.mock_flashcard:MockFlashcard", keywords=["quiz"], limits=limits)],
+        entry_point_group=None,
+    )
+    orch = ToolOrchestrator(tools=registry)
+    assert orch.adapters == {}
+
+    adapter = orch.get_adapter("quiz_maker")
+    assert isinstance(adapter, MockFlashcard)
+    assert orch.get_adapter("quiz_maker") is adapter
+    assert orch.guards["quiz_maker"].limits is limits
+    assert orch.get_adapter("flashcard_generator") is None
+    assert registry.routing_keywords() == {"quiz_maker": ["quiz"]}
+
+
+def test_tool_registry_loads_entry_points(monkeypatch):
+    class _EntryPoint:
+        def __init__(self, name, target):
+            self.name = name
+            self.load = lambda: target
+
+    def broken():
+        raise ImportError("missing dependency")
+
+    spec = ToolSpec("quiz_maker", "quiz_pkg.adapter:QuizMaker", "quiz_schema.json", keywords=["quiz"])
+    monkeypatch.setattr(
+        "src.tool_registry._entry_points",
+        lambda group: [_EntryPoint("quiz_maker", lambda: spec), _EntryPoint("broken", broken)],
+    )
+    registry = ToolRegistry()
+    assert registry.names() == ["flashcard_generator", "note_maker", "concept_explainer", "quiz_maker"]
+    assert registry.schema_files()["quiz_maker"] == "quiz_schema.json"
+
+
+def test_tool_registered_at_runtime_is_routed_and_gets_its_schema(tmp_path):
+    from src.agents import TutorAgent
+    from src.context_analysis import analyze_context
+    from src.conversation import ConversationText
+    from src.tool_registry import tool_registry
+
+    path = tmp_path / "quiz_schema.json"
+    path.write_text(json.dumps({"required": ["topic"], "properties": {"topic": {"type": "string"}}}))
+    orch = ToolOrchestrator()
+    # Built before the tool exists, like a long-lived session's conversation.
+    conversation = ConversationText([{"role": "user", "content": "Quiz me on cells"}], "please")
+    assert "quiz_maker" not in analyze_context([], "", conversation)["tools"]
+
+    tool_registry.register(ToolSpec("quiz_maker", "src.adapters.mock_flashcard:MockFlashcard", str(path), keywords=["quiz"]))
+    try:
+        assert "quiz_maker" in analyze_context([], "", conversation)["tools"]
+        conversation.append("another quiz")
+        assert "route:quiz_maker" in conversation.message_tags[-1]
+        assert TutorAgent(llm=object()).choose_tools([], "Give me a quiz") == ["quiz_maker"]
+        assert orch.load_schema("quiz_maker")["required"] == ["topic"]
+        assert isinstance(orch.get_adapter("quiz_maker"), MockFlashcard)
+    finally:
+        tool_registry.unregister("quiz_maker")
+    assert "quiz_maker" not in analyze_context([], "Give me a quiz")["tools"]